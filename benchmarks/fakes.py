@@ -0,0 +1,471 @@
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io, random, re, threading, time
+
+from urllib.parse import urlsplit
+from PIL import Image, ImageDraw
+
+
+class FakeServiceError(Exception):
+    def __init__(self, status: int = 503, retry_after: Optional[float] = None):
+        super().__init__(f"Injected error {status}")
+        self.status = status
+        self.headers = {}
+
+        if retry_after is not None:
+            self.headers["Retry-After"] = str(retry_after)
+
+
+class FakeBackend:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+
+    def _call(self, name: str):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+
+        if delay:
+            time.sleep(delay)
+
+        if failed:
+            raise FakeServiceError()
+
+
+class FakeRow(dict):
+    def __getattr__(self, name: str):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class FakeRowIterator:
+    def __init__(self, rows: List[Dict], num_dml_affected_rows: Optional[int] = None):
+        self.rows = [FakeRow(row) for row in rows]
+        self.total_rows = len(self.rows)
+        self.num_dml_affected_rows = num_dml_affected_rows
+
+    def __iter__(self) -> Iterator[FakeRow]:
+        return iter(self.rows)
+
+
+class FakeQueryJob:
+    def __init__(self, result: FakeRowIterator):
+        self._result = result
+
+    def result(self) -> FakeRowIterator:
+        return self._result
+
+
+class FakeTable:
+    def __init__(self, schema: Optional[List] = None):
+        self.schema = schema or []
+
+
+class FakeBigQueryClient(FakeBackend):
+    def __init__(
+        self,
+        handlers: List[Tuple[str, Callable[[str], List[Dict]]]],
+        project: str = "fake-project",
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.project = project
+        self.handlers = handlers
+        self.tables: Dict[str, List[Dict]] = {}
+        self.row_ids: Dict[str, set] = {}
+
+    def query(self, query: str) -> FakeQueryJob:
+        self._call("query")
+
+        if query.lstrip().startswith("MERGE"):
+            return FakeQueryJob(self._merge(query))
+
+        for pattern, handler in self.handlers:
+            if re.search(pattern, query):
+                return FakeQueryJob(FakeRowIterator(handler(query)))
+
+        return FakeQueryJob(FakeRowIterator([]))
+
+    def insert_rows_json(
+        self, table: str, json_rows: List[Dict], row_ids: Optional[List[str]] = None
+    ) -> List[Dict]:
+        self._call("insert_rows_json")
+
+        with self.lock:
+            table_id = self._table_id(table)
+            seen = self.row_ids.setdefault(table_id, set())
+
+            for row, row_id in zip(json_rows, row_ids or [None] * len(json_rows)):
+                if row_id is not None and row_id in seen:
+                    continue
+
+                seen.add(row_id)
+                self.tables.setdefault(table_id, []).append(row)
+
+        return []
+
+    def get_table(self, table_ref: str) -> FakeTable:
+        self._call("get_table")
+        return FakeTable()
+
+    def create_table(self, table, exists_ok: bool = False) -> FakeTable:
+        self._call("create_table")
+
+        with self.lock:
+            self.tables.setdefault(self._table_id(str(table.table_id)), [])
+
+        return FakeTable()
+
+    def delete_table(self, table_ref: str, not_found_ok: bool = False) -> None:
+        self._call("delete_table")
+
+        with self.lock:
+            self.tables.pop(self._table_id(table_ref), None)
+
+    def _merge(self, query: str) -> FakeRowIterator:
+        target, temp = re.findall(r"`([^`]+)`", query)[:2]
+
+        with self.lock:
+            rows = self.tables.get(self._table_id(temp), [])
+            self.tables.setdefault(self._table_id(target), []).extend(rows)
+
+        return FakeRowIterator([], num_dml_affected_rows=len(rows))
+
+    @staticmethod
+    def _table_id(table_ref: str) -> str:
+        return table_ref.split(".")[-1]
+
+
+class FakeMatch:
+    def __init__(self, id: str, score: float, metadata: Dict):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+
+
+class FakeQueryResponse:
+    def __init__(self, matches: List[FakeMatch]):
+        self.matches = matches
+
+
+class FakeAsyncResult:
+    def __init__(self, future: Future):
+        self.future = future
+
+    def get(self):
+        return self.future.result()
+
+
+class FakePineconeIndex(FakeBackend):
+    def __init__(self, pool_threads: int = 4, num_candidates: int = 256, **kwargs):
+        super().__init__(**kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=pool_threads)
+        self.num_candidates = num_candidates
+        self.namespaces: Dict[str, Dict[str, Dict]] = {}
+
+    def upsert(self, vectors: List[Dict], namespace: Optional[str] = None, **kwargs):
+        if kwargs.get("async_req"):
+            future = self.executor.submit(self._upsert, vectors, namespace)
+            return FakeAsyncResult(future)
+
+        return self._upsert(vectors, namespace)
+
+    def _upsert(self, vectors: List[Dict], namespace: Optional[str]) -> Dict:
+        self._call("upsert")
+
+        with self.lock:
+            store = self.namespaces.setdefault(namespace or "", {})
+
+            for vector in vectors:
+                store[vector["id"]] = vector
+
+        return {"upserted_count": len(vectors)}
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> Dict:
+        self._call("fetch")
+        store = self.namespaces.get(namespace or "", {})
+
+        return {"vectors": {id: store[id] for id in ids if id in store}}
+
+    def list(self, namespace: Optional[str] = None, limit: int = 100, **kwargs):
+        self._call("list")
+
+        with self.lock:
+            ids = sorted(self.namespaces.get(namespace or "", {}))
+
+        for start in range(0, len(ids), limit):
+            yield ids[start : start + limit]
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None, **kwargs) -> Dict:
+        self._call("delete")
+
+        with self.lock:
+            store = self.namespaces.get(namespace or "", {})
+
+            for id in ids:
+                store.pop(id, None)
+
+        return {}
+
+    def query(
+        self,
+        top_k: int,
+        id: Optional[str] = None,
+        vector: Optional[List[float]] = None,
+        filter: Optional[Dict] = None,
+        namespace: Optional[str] = None,
+        include_metadata: bool = False,
+        **kwargs,
+    ) -> FakeQueryResponse:
+        self._call("query")
+        store = self.namespaces.get(namespace or "", {})
+
+        if vector is None:
+            vector = store[id]["values"] if id in store else None
+
+        if vector is None:
+            return FakeQueryResponse([])
+
+        with self.lock:
+            ids = list(store.keys())
+            candidates = self.random.sample(ids, min(len(ids), self.num_candidates))
+
+        matches = []
+
+        for candidate in candidates:
+            entry = store[candidate]
+            metadata = entry.get("metadata") or {}
+
+            if candidate == id or not _match_filter(metadata, filter or {}):
+                continue
+
+            score = sum(a * b for a, b in zip(vector, entry["values"]))
+            matches.append(
+                FakeMatch(candidate, score, metadata if include_metadata else {})
+            )
+
+        matches.sort(key=lambda match: match.score, reverse=True)
+
+        return FakeQueryResponse(matches[:top_k])
+
+
+def _match_filter(metadata: Dict, filter: Dict) -> bool:
+    for key, condition in filter.items():
+        value = metadata.get(key)
+
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+
+    return True
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict]):
+        self.data = data
+
+
+class FakeTableBuilder:
+    def __init__(self, client: "FakeSupabaseClient", table_id: str):
+        self.client = client
+        self.table_id = table_id
+        self.operation = "select"
+        self.rows: List[Dict] = []
+        self.filters: List[Tuple[str, str]] = []
+        self.order_by: List[str] = []
+        self.n: Optional[int] = None
+        self.start = 0
+
+    def select(self, *args) -> "FakeTableBuilder":
+        self.operation = "select"
+        return self
+
+    def upsert(self, json: List[Dict], **kwargs) -> "FakeTableBuilder":
+        self.operation = "upsert"
+        self.rows = json
+        return self
+
+    def gte(self, column: str, value) -> "FakeTableBuilder":
+        self.filters.append((column, str(value)))
+        return self
+
+    def order(self, column: str, **kwargs) -> "FakeTableBuilder":
+        self.order_by.append(column)
+        return self
+
+    def limit(self, n: int) -> "FakeTableBuilder":
+        self.n = n
+        return self
+
+    def offset(self, start: int) -> "FakeTableBuilder":
+        self.start = start
+        return self
+
+    def execute(self) -> FakeResponse:
+        self.client._call(self.operation)
+
+        with self.client.lock:
+            table = self.client.tables.setdefault(self.table_id, [])
+
+            if self.operation == "upsert":
+                table.extend(self.rows)
+                return FakeResponse(list(self.rows))
+
+            rows = [
+                row
+                for row in table
+                if all(str(row[column]) >= value for column, value in self.filters)
+            ]
+
+        if self.order_by:
+            rows.sort(key=lambda row: [str(row[column]) for column in self.order_by])
+
+        end = None if self.n is None else self.start + self.n
+
+        return FakeResponse(rows[self.start : end])
+
+
+class FakeRpcBuilder:
+    def __init__(self, client: "FakeSupabaseClient", fn: str, params: Dict):
+        self.client = client
+        self.fn = fn
+        self.params = params
+
+    def execute(self) -> FakeResponse:
+        self.client._call("rpc")
+        handler = self.client.rpc_handlers.get(self.fn)
+
+        return FakeResponse(handler(self.params) if handler else [])
+
+
+class FakeSupabaseClient(FakeBackend):
+    def __init__(
+        self,
+        tables: Optional[Dict[str, List[Dict]]] = None,
+        rpc_handlers: Optional[Dict[str, Callable[[Dict], List[Dict]]]] = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.tables = tables or {}
+        self.rpc_handlers = rpc_handlers or {}
+
+    def table(self, table_id: str) -> FakeTableBuilder:
+        return FakeTableBuilder(self, table_id)
+
+    def rpc(self, fn: str, params: Dict) -> FakeRpcBuilder:
+        return FakeRpcBuilder(self, fn, params)
+
+
+class FakeEncoder:
+    def __init__(self, dimension: int = 512, latency_per_image: float = 0.0):
+        self.dimension = dimension
+        self.latency_per_image = latency_per_image
+
+    def encode(self, images: List[Image.Image]) -> List[List[float]]:
+        if self.latency_per_image:
+            time.sleep(self.latency_per_image * len(images))
+
+        embeddings = []
+
+        for image in images:
+            rng = random.Random(image.tobytes()[:64])
+            embeddings.append([rng.gauss(0, 1) for _ in range(self.dimension)])
+
+        return embeddings
+
+    def close(self):
+        pass
+
+
+class ImageServer:
+    def __init__(
+        self,
+        size: Tuple[int, int] = (256, 256),
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.size = size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "ImageServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def render(self, path: str) -> bytes:
+        rng = random.Random(urlsplit(path).path)
+        image = Image.new("RGB", self.size, (255, 255, 255))
+        draw = ImageDraw.Draw(image)
+        width, height = self.size
+
+        for _ in range(8):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.rectangle(
+                [x, y, x + rng.randrange(width // 2), y + rng.randrange(height // 2)],
+                fill=tuple(rng.randrange(256) for _ in range(3)),
+            )
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG")
+
+        return buffer.getvalue()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if server.random.random() < server.error_rate:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                content = server.render(self.path)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
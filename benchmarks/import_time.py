@@ -0,0 +1,107 @@
+import os, sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+from typing import Dict, List
+import argparse, json, re, subprocess
+
+
+RUNNERS = ["embed", "recommend", "insert", "to_bigquery"]
+HEAVY_MODULES = ["torch", "transformers", "pinecone", "google.cloud.bigquery"]
+
+FORBIDDEN_MODULES = {
+    "insert": ["torch", "transformers", "pinecone"],
+    "to_bigquery": ["torch", "transformers", "pinecone"],
+}
+
+PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {runners!r})
+
+start = time.perf_counter()
+import src
+import {runner}
+for name in {submodules!r}:
+    getattr(src, name)
+elapsed = time.perf_counter() - start
+
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def get_submodules(runner: str) -> List[str]:
+    with open(os.path.join(ROOT, "runners", f"{runner}.py"), encoding="utf-8") as f:
+        source = f.read()
+
+    return sorted(set(re.findall(r"\bsrc\.(\w+)", source)))
+
+
+def measure(runner: str) -> Dict:
+    code = PROBE.format(
+        root=ROOT,
+        runners=os.path.join(ROOT, "runners"),
+        runner=runner,
+        submodules=get_submodules(runner),
+        heavy=HEAVY_MODULES,
+    )
+
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT,
+    ).stdout
+
+    report = json.loads(output.strip().splitlines()[-1])
+    report["runner"] = runner
+    report["forbidden"] = [
+        name for name in FORBIDDEN_MODULES.get(runner, []) if name in report["loaded"]
+    ]
+
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runners", nargs="+", choices=RUNNERS, default=RUNNERS)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("--output", type=str, default=None)
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    reports, failed = [], False
+
+    for runner in args.runners:
+        report = measure(runner)
+        reports.append(report)
+
+        too_slow = args.max_seconds is not None and report["seconds"] > args.max_seconds
+        failed = failed or too_slow or bool(report["forbidden"])
+
+        print(
+            f"{runner:<12} {report['seconds']:.2f}s "
+            f"rss={report['max_rss_mb']:.0f}MB "
+            f"heavy={','.join(report['loaded']) or '-'}"
+            + (f" FORBIDDEN={','.join(report['forbidden'])}" if report["forbidden"] else "")
+            + (" TOO SLOW" if too_slow else "")
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=4)
+
+    sys.exit(int(failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+import os, sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "runners"))
+
+
+from typing import Callable, Dict, List
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import argparse, random, re, tempfile, time
+
+import src
+from fakes import (
+    FakeBigQueryClient,
+    FakeEncoder,
+    FakePineconeIndex,
+    FakeSupabaseClient,
+    ImageServer,
+)
+
+
+RUNNERS = ["embed", "recommend", "insert", "to_bigquery"]
+SECRETS = {
+    "GCP_CREDENTIALS": {},
+    "SUPABASE_URL": "http://supabase.local",
+    "SUPABASE_SERVICE_ROLE_KEY": "",
+}
+
+
+class BenchmarkComplete(Exception):
+    pass
+
+
+@contextmanager
+def patch(obj, name: str, value):
+    original = getattr(obj, name)
+    setattr(obj, name, value)
+
+    try:
+        yield
+    finally:
+        setattr(obj, name, original)
+
+
+def make_timestamps(n: int) -> List[str]:
+    start = datetime(2025, 1, 1)
+
+    return [(start + timedelta(seconds=i)).isoformat() for i in range(n)]
+
+
+def make_pins(
+    n: int,
+    base_url: str,
+    n_users: int,
+    duplicate_rate: float = 0.0,
+    seed: int = 0,
+) -> List[Dict]:
+    rng = random.Random(seed)
+    pins = []
+
+    for i, created_at in enumerate(make_timestamps(n)):
+        image_url = f"{base_url}/images/{i}.jpg"
+
+        if i > 0 and rng.random() < duplicate_rate:
+            image_url = f"{base_url}/images/{rng.randrange(i)}.jpg?copy={i}"
+
+        pins.append(
+            {
+                "id": f"pin-{i}",
+                "user_id": f"user-{i % n_users}",
+                "board_id": f"board-{i % (n_users * 4)}",
+                "created_at": created_at,
+                "image_url": image_url,
+                "board_name": f"Board {i % (n_users * 4)}",
+                "title": f"Pin {i}",
+            }
+        )
+
+    return pins
+
+
+def make_clustered_vector(
+    rng: random.Random, centroid: List[float], noise: float = 0.3
+) -> List[float]:
+    values = [value + rng.gauss(0, noise) for value in centroid]
+    norm = sum(value**2 for value in values) ** 0.5
+
+    return [value / norm for value in values]
+
+
+def backend_kwargs(args: argparse.Namespace) -> Dict:
+    return {
+        "latency": args.latency,
+        "jitter": args.latency / 2,
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+    }
+
+
+def bench_embed(args: argparse.Namespace, tmp_dir: str) -> int:
+    import embed
+
+    with ImageServer(latency=args.image_latency, seed=args.seed) as server:
+        pins = make_pins(
+            args.rows, server.url, args.users, args.duplicate_rate, args.seed
+        )
+
+        bq_client = FakeBigQueryClient(
+            handlers=[
+                (r"SELECT pinterest\.user_id, board_pin", lambda query: pins),
+            ],
+            **backend_kwargs(args),
+        )
+        pc_index = FakePineconeIndex(
+            pool_threads=src.enums.PINECONE_POOL_THREADS, **backend_kwargs(args)
+        )
+        encoder = FakeEncoder(latency_per_image=args.encode_latency)
+
+        with patch(embed, "initialize_clients", lambda: (bq_client, pc_index)), patch(
+            embed, "CHECKPOINT_PATH", os.path.join(tmp_dir, "embed.sqlite")
+        ), patch(
+            embed, "PHASH_ENABLED", args.phash
+        ), patch(
+            embed, "PHASH_PATH", os.path.join(tmp_dir, "phash.sqlite")
+        ), patch(
+            embed, "ARCHIVE_ENABLED", args.archive
+        ), patch(
+            embed, "ARCHIVE_DIR", os.path.join(tmp_dir, "archive")
+        ), patch(
+            embed, "NAMESPACE_BUCKETS", args.namespace_buckets or None
+        ), patch(
+            embed, "SLIM_METADATA", args.slim_metadata
+        ), patch(
+            src.encoder, "FashionCLIPEncoder", lambda: encoder
+        ):
+            embed.main([])
+
+    return len(pins)
+
+
+def bench_recommend(args: argparse.Namespace, tmp_dir: str) -> int:
+    import recommend
+
+    rng = random.Random(args.seed)
+    pins = make_pins(args.rows, "http://images.local", args.users)
+    pc_index = FakePineconeIndex(**backend_kwargs(args))
+
+    centroids = [[rng.gauss(0, 1) for _ in range(64)] for _ in range(17)]
+    pin_vectors: Dict[str, List[Dict]] = {}
+    pin_metadata: Dict[str, Dict] = {}
+    vectors = []
+
+    for i, pin in enumerate(pins):
+        point_id = f"point-{pin['id']}"
+        metadata = {key: value for key, value in pin.items() if value is not None}
+        metadata["from_pinterest"] = True
+        pin_metadata[point_id] = dict(metadata, point_id=point_id)
+
+        if args.slim_metadata:
+            metadata = {
+                key: metadata[key] for key in src.enums.PINECONE_SLIM_METADATA_FIELDS
+            }
+
+        vectors.append(
+            {
+                "id": point_id,
+                "values": make_clustered_vector(rng, centroids[i % len(centroids)]),
+                "metadata": metadata,
+            }
+        )
+        pin_vectors.setdefault(pin["user_id"], []).append(
+            {"user_id": pin["user_id"], "pin_id": pin["id"], "point_id": point_id}
+        )
+
+    pc_index.upsert(vectors=vectors)
+
+    if args.namespace_buckets:
+        src.pinecone.repartition(
+            index=pc_index, num_buckets=args.namespace_buckets, delete=True
+        )
+
+    user_ids = [{"user_id": user_id} for user_id in pin_vectors]
+    user_ids += [{"user_id": f"user-inactive-{i}"} for i in range(args.users // 5)]
+    n_calls = {"users": 0}
+
+    def fetch_users(query: str) -> List[Dict]:
+        n_calls["users"] += 1
+
+        if n_calls["users"] > 1:
+            raise BenchmarkComplete()
+
+        return user_ids
+
+    def fetch_vectors(query: str) -> List[Dict]:
+        user_id = query.split("pv.user_id = '")[1].split("'")[0]
+        return pin_vectors.get(user_id, [])[: recommend.NUM_REFERENCE_VECTORS_MAX]
+
+    def fetch_board_ids(query: str) -> List[Dict]:
+        boards = bq_client.tables.get(src.enums.GCP_TABLE_ID_BOARD_RECOMMEND, [])
+        board_ids = {board["user_id"]: board["id"] for board in boards}
+        return [
+            {
+                "user_id": row["user_id"],
+                "board_id": board_ids.get(row["user_id"]),
+                "has_vectors": row["user_id"] in pin_vectors,
+            }
+            for row in user_ids
+        ]
+
+    def fetch_pin_metadata(query: str) -> List[Dict]:
+        point_ids = re.findall(r"'([^']+)'", query.split("UNNEST")[1])
+
+        return [pin_metadata[point_id] for point_id in point_ids if point_id in pin_metadata]
+
+    bq_client = FakeBigQueryClient(
+        handlers=[
+            (r"^\s*CREATE TABLE IF NOT EXISTS", lambda query: []),
+            (r"AS board_id", fetch_board_ids),
+            (r"SELECT activity\.user_id", fetch_users),
+            (r"point_id IN UNNEST", fetch_pin_metadata),
+            (r"pv\.user_id", fetch_vectors),
+        ],
+        **backend_kwargs(args),
+    )
+
+    with patch(recommend, "initialize_clients", lambda: (bq_client, pc_index)), patch(
+        recommend, "NAMESPACE_BUCKETS", args.namespace_buckets or None
+    ), patch(
+        recommend, "SLIM_METADATA", args.slim_metadata
+    ):
+        try:
+            recommend.main()
+        except BenchmarkComplete:
+            pass
+
+    return len(user_ids)
+
+
+def bench_insert(args: argparse.Namespace, tmp_dir: str) -> int:
+    import insert
+
+    boards = [
+        {
+            "id": f"board-{i}",
+            "user_id": f"user-{i}",
+            "name": src.enums.DEFAULT_RECOMMEND_BOARD_NAME,
+            "description": src.enums.DEFAULT_RECOMMEND_BOARD_DESCRIPTION,
+            "created_at": created_at,
+            "from_pinterest": False,
+        }
+        for i, created_at in enumerate(make_timestamps(args.users))
+    ]
+    pins = [
+        {
+            "id": f"pin-{i}",
+            "created_at": created_at,
+            "board_id": f"board-{i % args.users}",
+            "image_url": f"http://images.local/{i}.jpg",
+            "title": f"Pin {i}",
+            "point_id": f"point-{i}",
+            "from_pinterest": True,
+        }
+        for i, created_at in enumerate(make_timestamps(args.rows))
+    ]
+
+    bq_client = FakeBigQueryClient(
+        handlers=[
+            (r"SELECT board\.\*", lambda query: boards),
+            (r"SELECT pin\.\*", lambda query: pins),
+        ],
+        **backend_kwargs(args),
+    )
+    spb_client = FakeSupabaseClient(**backend_kwargs(args))
+
+    with patch(src.utils, "load_secrets", lambda env_var_name: SECRETS), patch(
+        src.bigquery, "init_client", lambda *args, **kwargs: bq_client
+    ), patch(src.supabase, "init_client", lambda *args, **kwargs: spb_client):
+        insert.main()
+
+    return len(boards) + len(pins)
+
+
+def bench_to_bigquery(args: argparse.Namespace, tmp_dir: str) -> int:
+    import to_bigquery
+
+    rows = [
+        {"user_id": f"user-{i}", "created_at": created_at}
+        for i, created_at in enumerate(make_timestamps(args.rows))
+    ]
+
+    bq_client = FakeBigQueryClient(
+        handlers=[(r"MAX\(created_at\)", lambda query: [{"created_at": None}])],
+        **backend_kwargs(args),
+    )
+    spb_client = FakeSupabaseClient(
+        tables={src.enums.SUPABASE_TABLE_ID_PINTEREST: rows},
+        **backend_kwargs(args),
+    )
+
+    with patch(src.utils, "load_secrets", lambda env_var_name: SECRETS), patch(
+        src.bigquery, "init_client", lambda *args, **kwargs: bq_client
+    ), patch(src.supabase, "init_client", lambda *args, **kwargs: spb_client), patch(
+        to_bigquery, "CURSOR_PATH", os.path.join(tmp_dir, "to_bigquery.json")
+    ):
+        to_bigquery.main()
+
+    return len(rows)
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace, str], int]] = {
+    "embed": bench_embed,
+    "recommend": bench_recommend,
+    "insert": bench_insert,
+    "to_bigquery": bench_to_bigquery,
+}
+
+
+def run(name: str, args: argparse.Namespace) -> Dict:
+    src.metrics.reset()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        n = BENCHMARKS[name](args, tmp_dir)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "runner": name,
+        "rows": n,
+        "seconds": elapsed,
+        "rows_per_second": n / elapsed if elapsed > 0 else 0.0,
+        "metrics": src.metrics.summary(),
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(
+        f"\n{report['runner']}: {report['rows']} rows in {report['seconds']:.2f}s "
+        f"({report['rows_per_second']:.1f} rows/s)"
+    )
+
+    histograms = sorted(
+        report["metrics"]["histograms"].items(),
+        key=lambda item: item[1]["sum"],
+        reverse=True,
+    )
+
+    for name, stats in histograms:
+        print(
+            f"  {name:<40} n={stats['count']:<8} "
+            f"total={stats['sum']:.3f}s mean={stats['mean'] * 1000:.2f}ms"
+        )
+
+    for name, value in sorted(report["metrics"]["counters"].items()):
+        print(f"  {name:<40} {value}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runners", nargs="+", choices=RUNNERS, default=RUNNERS)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--image-latency", type=float, default=0.05)
+    parser.add_argument("--encode-latency", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--phash", action="store_true")
+    parser.add_argument("--archive", action="store_true")
+    parser.add_argument("--namespace-buckets", type=int, default=0)
+    parser.add_argument("--slim-metadata", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None)
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    src.metrics.enable()
+
+    reports = []
+
+    for name in args.runners:
+        report = run(name, args)
+        print_report(report)
+        reports.append(report)
+
+    if args.output:
+        src.utils.save_json(reports, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,10 @@ import sys
 sys.path.append("../")
 
 
-from typing import List, Iterable, Tuple
+from typing import Dict, List, Iterable, Optional, Tuple
+from uuid import uuid4
+from datetime import datetime
+import argparse, os, time
 
 from tqdm import tqdm
 from PIL import Image
@@ -12,7 +15,21 @@ from pinecone import Pinecone
 import src
 
 
-BATCH_SIZE = 64
+BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", src.enums.BATCH_SIZE_INITIAL))
+ADAPTIVE_BATCH_SIZE = os.getenv("EMBED_ADAPTIVE_BATCH_SIZE", "1") == "1"
+MAX_RSS_MB = int(os.getenv("EMBED_MAX_RSS_MB", "0")) or None
+CHECKPOINT_PATH = os.getenv("EMBED_CHECKPOINT_PATH", src.enums.CHECKPOINT_PATH)
+FULL_SCAN = os.getenv("EMBED_FULL_SCAN", "0") == "1"
+ENCODER_NUM_WORKERS = int(os.getenv("ENCODER_NUM_WORKERS", "1"))
+ENCODER_NUM_THREADS = int(os.getenv("ENCODER_NUM_THREADS", "0")) or None
+PHASH_ENABLED = os.getenv("EMBED_PHASH", "0") == "1"
+PHASH_PATH = os.getenv("EMBED_PHASH_PATH", src.enums.PHASH_PATH)
+PHASH_THRESHOLD = int(os.getenv("EMBED_PHASH_THRESHOLD", src.enums.PHASH_THRESHOLD))
+PHASH_REUSE_POINT_ID = os.getenv("EMBED_PHASH_REUSE_POINT_ID", "0") == "1"
+ARCHIVE_ENABLED = os.getenv("EMBED_ARCHIVE", "0") == "1"
+ARCHIVE_DIR = os.getenv("EMBED_ARCHIVE_DIR", src.enums.ARCHIVE_DIR)
+NAMESPACE_BUCKETS = int(os.getenv("PINECONE_NAMESPACE_BUCKETS", "0")) or None
+SLIM_METADATA = os.getenv("PINECONE_SLIM_METADATA", "0") == "1"
 
 
 def initialize_clients() -> Tuple:
@@ -21,111 +38,365 @@ def initialize_clients() -> Tuple:
     bq_client = src.bigquery.init_client(secrets["GCP_CREDENTIALS"])
 
     pc_client = Pinecone(api_key=secrets.get("PINECONE_API_KEY"))
-    pc_index = pc_client.Index(src.enums.PINECONE_INDEX_NAME)
+    pc_index = pc_client.Index(
+        src.enums.PINECONE_INDEX_NAME,
+        pool_threads=src.enums.PINECONE_POOL_THREADS,
+    )
 
     return bq_client, pc_index
 
 
-def fetch_pins() -> Iterable:
-    query = src.queries.make_board_pin_query()
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--shard-index", type=int, default=int(os.getenv("EMBED_SHARD_INDEX", "0"))
+    )
+    parser.add_argument(
+        "--num-shards", type=int, default=int(os.getenv("EMBED_NUM_SHARDS", "1"))
+    )
+
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.shard_index < args.num_shards:
+        parser.error("--shard-index must be in [0, --num-shards)")
+
+    return args
+
+
+def get_checkpoint_path(shard_index: int, num_shards: int) -> str:
+    if num_shards == 1:
+        return CHECKPOINT_PATH
+
+    root, extension = os.path.splitext(CHECKPOINT_PATH)
+
+    return f"{root}-{shard_index}-of-{num_shards}{extension}"
+
+
+def get_watermark_name(shard_index: int, num_shards: int) -> str:
+    if num_shards == 1:
+        return src.enums.CHECKPOINT_WATERMARK_BOARD_PIN
+
+    return f"{src.enums.CHECKPOINT_WATERMARK_BOARD_PIN}-{shard_index}-of-{num_shards}"
+
+
+def fetch_pins(shard_index: int, num_shards: int) -> Iterable:
+    created_at = None
+
+    if not FULL_SCAN:
+        created_at = src.bigquery.get_watermark(
+            bq_client, get_watermark_name(shard_index, num_shards)
+        )
+
+    query = src.queries.make_board_pin_query(
+        created_at=created_at,
+        shard_index=shard_index,
+        num_shards=num_shards,
+    )
+
+    return src.bigquery.query(bq_client, query)
+
+
+def download_batch(entries: List[Dict]) -> None:
+    downloaded = []
 
-    return bq_client.query(query).result()
+    for entry in entries:
+        if entry["state"] != src.enums.CHECKPOINT_STATE_QUEUED:
+            continue
 
+        image = src.utils.download_image(entry["row"]["image_url"])
 
-def process_batch(
-    pins: List[src.models.Pin],
+        if image:
+            entry["image"] = image
+            entry["state"] = src.enums.CHECKPOINT_STATE_DOWNLOADED
+            downloaded.append(entry)
+        else:
+            src.metrics.increment("embed_download_retries")
+
+    checkpoint.mark_downloaded(downloaded)
+
+
+def encode_batch(entries: List[Dict]) -> int:
+    entries_valid, images, failed, duplicates = [], [], [], []
+
+    for entry in entries:
+        if entry["state"] != src.enums.CHECKPOINT_STATE_DOWNLOADED:
+            continue
+
+        image = src.utils.load_image(entry["image"])
+
+        if not image:
+            entry["state"] = src.enums.CHECKPOINT_STATE_FAILED
+            failed.append(entry["id"])
+            continue
+
+        if phash_index and reuse_duplicate(entry, image):
+            duplicates.append(entry)
+            continue
+
+        entries_valid.append(entry)
+        images.append(image)
+
+    embeddings, encode_success = encode_images(images)
+    encoded = list(duplicates)
+    n_errors = int(not encode_success)
+
+    for entry, embedding in zip(entries_valid, embeddings):
+        if embedding is None:
+            entry["state"] = src.enums.CHECKPOINT_STATE_FAILED
+            failed.append(entry["id"])
+            n_errors += 1
+            continue
+
+        entry["embedding"] = embedding
+        entry["point_id"] = str(uuid4())
+        entry["state"] = src.enums.CHECKPOINT_STATE_ENCODED
+        encoded.append(entry)
+
+    checkpoint.mark_encoded(encoded)
+    checkpoint.mark_upserted(
+        [
+            entry["id"]
+            for entry in duplicates
+            if entry["state"] == src.enums.CHECKPOINT_STATE_UPSERTED
+        ]
+    )
+    checkpoint.mark_failed(failed)
+
+    return n_errors
+
+
+def reuse_duplicate(entry: Dict, image: Image.Image) -> bool:
+    entry["phash"] = src.phash.compute_hash(image)
+    entry["thumbnail"] = src.phash.compute_thumbnail(image)
+    match = phash_index.lookup(
+        entry["phash"], entry["thumbnail"], threshold=PHASH_THRESHOLD
+    )
+
+    if match is None:
+        return False
+
+    entry["duplicate_of"] = match["point_id"]
+    entry["embedding"] = match["embedding"]
+
+    if PHASH_REUSE_POINT_ID:
+        entry["point_id"] = match["point_id"]
+        entry["state"] = src.enums.CHECKPOINT_STATE_UPSERTED
+    else:
+        entry["point_id"] = str(uuid4())
+        entry["state"] = src.enums.CHECKPOINT_STATE_ENCODED
+
+    src.metrics.increment("phash_duplicates")
+
+    return True
+
+
+def encode_images(
     images: List[Image.Image],
-) -> Tuple[bool, bool, int]:
+) -> Tuple[List[Optional[List[float]]], bool]:
+    if len(images) == 0:
+        return [], True
+
     try:
-        embeddings = encoder.encode(images)
+        return encoder.encode(images), True
 
     except Exception as e:
-        pins_valid, embeddings = [], []
+        embeddings = []
 
-        for pin, image in zip(pins, images):
+        for image in images:
             try:
-                embedding = encoder.encode([image])
-                pins_valid.append(pin)
-                embeddings.append(embedding)
+                embeddings.append(encoder.encode([image])[0])
 
             except Exception as e:
-                continue
+                embeddings.append(None)
+
+        return embeddings, False
+
+
+def upsert_batch(entries: List[Dict]) -> bool:
+    entries = [
+        entry
+        for entry in entries
+        if entry["state"] == src.enums.CHECKPOINT_STATE_ENCODED
+    ]
+
+    if len(entries) == 0:
+        return False
+
+    pins = src.models.Pin.from_rows(entry["row"] for entry in entries)
+    metadata_fields = src.enums.PINECONE_SLIM_METADATA_FIELDS if SLIM_METADATA else None
+    vectors = []
+
+    for entry, pin in zip(entries, pins):
+        vector = src.models.Vector(
+            values=entry["embedding"],
+            metadata=pin.to_metadata(metadata_fields),
+            id=entry["point_id"],
+        )
+
+        vectors.append(vector.to_dict())
+
+    if NAMESPACE_BUCKETS:
+        pc_results = src.pinecone.upsert_partitioned(
+            index=pc_index,
+            vectors=vectors,
+            num_buckets=NAMESPACE_BUCKETS,
+        )
+    else:
+        pc_results = src.pinecone.upsert(
+            index=pc_index,
+            vectors=vectors,
+        )
+
+    upserted = []
+
+    for entry, success in zip(entries, pc_results):
+        if success:
+            entry["state"] = src.enums.CHECKPOINT_STATE_UPSERTED
+            upserted.append(entry["id"])
+
+    if archive:
+        archive.append(
+            [vector for vector, success in zip(vectors, pc_results) if success]
+        )
+        archive.flush()
+
+    checkpoint.mark_upserted(upserted)
+
+    if phash_index:
+        phash_index.add(
+            [
+                entry
+                for entry in entries
+                if entry["state"] == src.enums.CHECKPOINT_STATE_UPSERTED
+                and "phash" in entry
+                and not entry.get("duplicate_of")
+            ]
+        )
+
+    return len(upserted) == len(entries)
 
-        pins = pins_valid
 
-    pin_vectors, vectors = [], []
+def merge_batch(entries: List[Dict]) -> Tuple[bool, int]:
+    entries = [
+        entry
+        for entry in entries
+        if entry["state"] == src.enums.CHECKPOINT_STATE_UPSERTED
+    ]
 
-    for pin, embedding in zip(pins, embeddings):
-        metadata = pin.to_dict()
-        vector = src.models.Vector(values=embedding, metadata=metadata)
+    if len(entries) == 0:
+        return False, 0
 
+    created_at = datetime.now().isoformat()
+    pin_vectors = []
+
+    for entry in entries:
         pin_vector = src.models.PinVector(
-            user_id=pin.user_id,
-            pin_id=pin.id,
-            point_id=vector.id,
+            user_id=entry["row"]["user_id"],
+            pin_id=entry["row"]["id"],
+            point_id=entry["point_id"],
+            created_at=created_at,
         )
 
         pin_vectors.append(pin_vector.to_dict())
-        vectors.append(vector.to_dict())
 
-    pc_success = src.pinecone.insert(
-        index=pc_index,
-        vectors=vectors,
+    num_inserted, bq_success = src.bigquery.insert_unique(
+        client=bq_client,
+        dataset_id=src.enums.bigquery.GCP_DATASET_ID_SUPABASE,
+        table_id=src.enums.bigquery.GCP_TABLE_ID_PIN_VECTOR,
+        rows=pin_vectors,
+        field_ids=["id"],
     )
 
-    bq_success, num_inserted = False, 0
+    if bq_success:
+        checkpoint.mark_merged([entry["id"] for entry in entries])
 
-    if pc_success:
-        num_inserted, bq_success = src.bigquery.insert_unique(
-            client=bq_client,
-            dataset_id=src.enums.bigquery.GCP_DATASET_ID_SUPABASE,
-            table_id=src.enums.bigquery.GCP_TABLE_ID_PIN_VECTOR,
-            rows=pin_vectors,
-            field_ids=["id"],
-        )
+        for entry in entries:
+            entry["state"] = src.enums.CHECKPOINT_STATE_MERGED
+
+    return bq_success, num_inserted
+
+
+def process_batch(entries: List[Dict]) -> Tuple[bool, bool, int, int]:
+    with src.metrics.timer("embed_download_batch"), src.profiling.stage("download"):
+        download_batch(entries)
+
+    with src.metrics.timer("embed_encode_batch"), src.profiling.stage("encode"):
+        n_errors = encode_batch(entries)
+
+    with src.metrics.timer("embed_upsert_batch"), src.profiling.stage("upsert"):
+        pc_success = upsert_batch(entries)
+
+    with src.metrics.timer("embed_merge_batch"), src.profiling.stage("merge"):
+        bq_success, num_inserted = merge_batch(entries)
+
+    for entry in entries:
+        src.metrics.increment(f"embed_pins_{entry['state']}")
+
+    return pc_success, bq_success, num_inserted, n_errors
 
-    return pc_success, bq_success, num_inserted
 
+@src.profiling.profile_main("embed")
+def main(argv: Optional[List[str]] = None) -> None:
+    global bq_client, pc_index, encoder, checkpoint, phash_index, archive
 
-def main() -> None:
-    global bq_client, pc_index, encoder
+    args = parse_args(argv)
 
     bq_client, pc_index = initialize_clients()
-    encoder = src.encoder.FashionCLIPEncoder()
+    encoder = src.encoder.make_encoder(
+        num_workers=ENCODER_NUM_WORKERS,
+        num_threads=ENCODER_NUM_THREADS,
+    )
+    checkpoint = src.checkpoint.Checkpoint(
+        get_checkpoint_path(args.shard_index, args.num_shards)
+    )
+    phash_index = src.phash.HashIndex(PHASH_PATH) if PHASH_ENABLED else None
+    archive = src.archive.EmbeddingArchive(ARCHIVE_DIR) if ARCHIVE_ENABLED else None
+
+    try:
+        run(args)
+    finally:
+        close()
+
 
+def run(args: argparse.Namespace) -> None:
     n, n_success = 0, 0
     n_pc_success, n_bq_success, success_rate = 0, 0, 0
 
-    loader = fetch_pins()
+    checkpoint.prune()
+    rows = fetch_pins(args.shard_index, args.num_shards)
+    total = checkpoint.enqueue(dict(row) for row in rows)
 
-    if loader.total_rows == 0:
+    if total == 0:
         return
 
-    batch_ix, output_pins, images = 0, [], []
-    loop = tqdm(iterable=loader, total=loader.total_rows)
+    batch_size = BATCH_SIZE
 
-    for row in loop:
-        n += 1
-        pin = src.models.Pin(**dict(row))
-        image = src.utils.download_image_as_pil(pin.image_url)
+    if ADAPTIVE_BATCH_SIZE:
+        batch_size = src.batching.BatchSizeController(
+            size=BATCH_SIZE,
+            max_rss_bytes=MAX_RSS_MB * 1024 * 1024 if MAX_RSS_MB else None,
+        )
 
-        if image:
-            images.append(image)
-            output_pins.append(pin)
+    batch_ix = 0
+    loop = tqdm(total=total)
+
+    for entries in checkpoint.iterate_pending(batch_size):
+        n += len(entries)
+        start = time.perf_counter()
+        pc_success, bq_success, n_pins, n_errors = process_batch(entries)
+        n_pc_success += int(pc_success)
+        n_bq_success += int(bq_success)
 
-        if len(images) == len(output_pins) == BATCH_SIZE or n == loader.total_rows:
-            pc_success, bq_success, n_pins = process_batch(output_pins, images)
-            n_pc_success += int(pc_success)
-            n_bq_success += int(bq_success)
+        if ADAPTIVE_BATCH_SIZE:
+            batch_size.update(len(entries), time.perf_counter() - start, n_errors)
 
-            if pc_success and bq_success:
-                n_success += n_pins
+        if bq_success:
+            n_success += n_pins
 
-            batch_ix += 1
-            output_pins, images = [], []
-            success_rate = n_success / n
+        batch_ix += 1
+        success_rate = n_success / n
 
-        loop.set_description(
+        description = (
             f"Batch: {batch_ix} | "
             f"Processed: {n} | "
             f"Success rate: {success_rate:.2f} | "
@@ -133,6 +404,38 @@ def main() -> None:
             f"BigQuery: {n_bq_success}"
         )
 
+        if ADAPTIVE_BATCH_SIZE:
+            description += f" | Batch size: {batch_size.size} ({batch_size.decision})"
+
+        loop.update(len(entries))
+        loop.set_description(description)
+
+    src.metrics.increment("embed_pins_expired", checkpoint.expire())
+    update_watermark(args.shard_index, args.num_shards)
+
+
+def close() -> None:
+    checkpoint.close()
+    encoder.close()
+
+    if phash_index:
+        phash_index.close()
+
+    if archive:
+        archive.close()
+
+
+def update_watermark(shard_index: int, num_shards: int) -> None:
+    if checkpoint.count_pending() > 0:
+        return
+
+    created_at = checkpoint.get_max_created_at()
+
+    if created_at:
+        src.bigquery.set_watermark(
+            bq_client, get_watermark_name(shard_index, num_shards), created_at
+        )
+
 
 if __name__ == "__main__":
     main()
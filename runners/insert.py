@@ -3,46 +3,84 @@ import sys
 sys.path.append("../")
 
 
+from typing import Dict, List
+from datetime import datetime
+
 import src
 
 
-def insert_boards():
+def insert_boards() -> bool:
     query = src.queries.make_insert_board_query()
-    response = bq_client.query(query).result()
+    response = src.bigquery.query(bq_client, query)
+
+    created_at = datetime.now().isoformat()
+
+    rows = [
+        board.to_dict()
+        for board in src.models.Board.from_rows(response, created_at=created_at)
+    ]
+
+    return insert_rows(
+        rows=rows,
+        spb_table_id=src.enums.SUPABASE_TABLE_ID_BOARD,
+        bq_table_id=src.enums.GCP_TABLE_ID_BOARD_INSERTED,
+    )
+
+
+def insert_pins() -> bool:
+    query = src.queries.make_insert_pin_query()
+    response = src.bigquery.query(bq_client, query)
 
-    rows, inserted = [], []
+    created_at = datetime.now().isoformat()
+
+    rows = []
     for row in response:
-        entry = src.models.Board(**row)
-        entry.reset_created_at()
+        entry = dict(row)
+        entry["created_at"] = created_at
+
+        rows.append(entry)
 
-        rows.append(entry.to_dict())
+    return insert_rows(
+        rows=rows,
+        spb_table_id=src.enums.SUPABASE_TABLE_ID_PIN,
+        bq_table_id=src.enums.GCP_TABLE_ID_PIN_INSERTED,
+    )
 
-        inserted.append(
-            {
-                "id": entry.id,
-                "created_at": entry.created_at,
-            }
-        )
 
-    if src.supabase.insert(
+def insert_rows(rows: List[Dict], spb_table_id: str, bq_table_id: str) -> bool:
+    if len(rows) == 0:
+        return False
+
+    rows_inserted = src.supabase.bulk_insert(
         client=spb_client,
-        table_id=src.enums.SUPABASE_TABLE_ID_BOARD,
+        table_id=spb_table_id,
         rows=rows,
-    ):
-        return src.bigquery.insert(
-            client=bq_client,
-            dataset_id=src.enums.GCP_DATASET_ID_SUPABASE,
-            table_id=src.enums.GCP_TABLE_ID_BOARD_INSERTED,
-            rows=inserted,
-        )
+    )
+
+    src.metrics.increment(f"insert_{spb_table_id}_rows", len(rows))
+    src.metrics.increment(f"insert_{spb_table_id}_rows_inserted", len(rows_inserted))
 
-    return False
+    if len(rows_inserted) == 0:
+        return False
 
+    inserted = [
+        {
+            "id": row["id"],
+            "created_at": row["created_at"],
+        }
+        for row in rows_inserted
+    ]
 
-def insert_pins():
-    ...
+    return src.bigquery.insert(
+        client=bq_client,
+        dataset_id=src.enums.GCP_DATASET_ID_SUPABASE,
+        table_id=bq_table_id,
+        rows=inserted,
+        field_ids=["id"],
+    ) and len(rows_inserted) == len(rows)
 
 
+@src.profiling.profile_main("insert")
 def main() -> None:
     secrets = src.utils.load_secrets(env_var_name="SECRETS_JSON")
 
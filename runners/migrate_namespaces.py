@@ -0,0 +1,59 @@
+import sys
+
+sys.path.append("../")
+
+
+from typing import List, Optional
+import argparse, os
+
+from pinecone import Pinecone
+
+import src
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index-name", type=str, default=src.enums.PINECONE_INDEX_NAME)
+    parser.add_argument("--namespace", type=str, default=None)
+    parser.add_argument(
+        "--num-buckets",
+        type=int,
+        default=int(os.getenv("PINECONE_NAMESPACE_BUCKETS", "1")),
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=src.enums.PINECONE_FETCH_BATCH_SIZE
+    )
+    parser.add_argument("--delete", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if args.num_buckets < 1:
+        parser.error("--num-buckets must be at least 1")
+
+    return args
+
+
+@src.profiling.profile_main("migrate_namespaces")
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    secrets = src.utils.load_secrets(env_var_name="SECRETS_JSON")
+
+    pc_client = Pinecone(api_key=secrets.get("PINECONE_API_KEY"))
+    pc_index = pc_client.Index(
+        args.index_name,
+        pool_threads=src.enums.PINECONE_POOL_THREADS,
+    )
+
+    n, n_success = src.pinecone.repartition(
+        index=pc_index,
+        num_buckets=args.num_buckets,
+        namespace=args.namespace,
+        batch_size=args.batch_size,
+        delete=args.delete,
+    )
+
+    print(f"Processed: {n} | Repartitioned: {n_success}")
+
+
+if __name__ == "__main__":
+    main()
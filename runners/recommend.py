@@ -4,8 +4,9 @@ sys.path.append("../")
 
 import src
 
-from typing import Tuple, List, Iterable
-import random
+from typing import Dict, Tuple, List, Iterable
+from datetime import datetime
+import os, random
 from tqdm import tqdm
 from pinecone import Pinecone
 
@@ -16,6 +17,8 @@ NUM_NEIGHBORS = 3
 NUM_PREFETCH = 10
 MIN_SIMILARITY_SCORE = 0.5
 MAX_SIMILARITY_SCORE = 0.95
+NAMESPACE_BUCKETS = int(os.getenv("PINECONE_NAMESPACE_BUCKETS", "0")) or None
+SLIM_METADATA = os.getenv("PINECONE_SLIM_METADATA", "0") == "1"
 
 
 def initialize_clients() -> Tuple:
@@ -29,10 +32,16 @@ def initialize_clients() -> Tuple:
     return bq_client, pc_index
 
 
+def refresh_user_activity() -> None:
+    query = src.queries.make_user_activity_merge_query()
+
+    src.bigquery.query(bq_client, query)
+
+
 def fetch_user_ids(is_new: bool) -> Iterable:
     query = src.queries.make_top_user_query(is_new)
 
-    return bq_client.query(query).result()
+    return src.bigquery.query(bq_client, query)
 
 
 def fetch_reference_vectors(user_id: str) -> Iterable:
@@ -43,75 +52,114 @@ def fetch_reference_vectors(user_id: str) -> Iterable:
     }
 
     query = src.queries.make_pin_vector_query(is_new=True, **query_args)
-    response = bq_client.query(query).result()
+    response = src.bigquery.query(bq_client, query)
 
     if response.total_rows == 0:
         query = src.queries.make_pin_vector_query(is_new=False, **query_args)
-        response = bq_client.query(query).result()
+        response = src.bigquery.query(bq_client, query)
 
     return response
 
 
-def get_recommend_board_id(user_id: str) -> str:
-    query = src.queries.make_recommend_board_id_query(user_id)
-    response = bq_client.query(query).result()
+def fetch_recommend_board_ids(is_new: bool) -> Tuple[Dict[str, str], List[str]]:
+    query = src.queries.make_recommend_board_ids_query(is_new)
+    response = list(src.bigquery.query(bq_client, query))
 
-    if response.total_rows == 0:
-        board = src.models.Board(user_id=user_id)
+    board_ids = {row["user_id"]: row["board_id"] for row in response if row["board_id"]}
+    user_ids_with_vectors = [row["user_id"] for row in response if row["has_vectors"]]
+
+    return board_ids, user_ids_with_vectors
+
+
+def provision_recommend_boards(is_new: bool) -> Dict[str, str]:
+    board_ids, user_ids_with_vectors = fetch_recommend_board_ids(is_new)
+
+    created_at = datetime.now().isoformat()
+    boards = [
+        src.models.Board(user_id=user_id, created_at=created_at)
+        for user_id in user_ids_with_vectors
+        if user_id not in board_ids
+    ]
+
+    if not boards:
+        return board_ids
+
+    n_inserted, success = src.bigquery.insert_unique(
+        client=bq_client,
+        dataset_id=src.enums.bigquery.GCP_DATASET_ID_SUPABASE,
+        table_id=src.enums.bigquery.GCP_TABLE_ID_BOARD_RECOMMEND,
+        rows=[board.to_dict() for board in boards],
+        field_ids=["user_id"],
+    )
+
+    src.metrics.increment("recommend_boards_created", n_inserted)
 
-        if src.bigquery.insert(
-            client=bq_client,
-            dataset_id=src.enums.bigquery.GCP_DATASET_ID_SUPABASE,
-            table_id=src.enums.bigquery.GCP_TABLE_ID_BOARD_RECOMMEND,
-            rows=[board.to_dict()],
-        ):
-            return board.id
+    if success and n_inserted == len(boards):
+        board_ids.update({board.user_id: board.id for board in boards})
+    else:
+        board_ids, _ = fetch_recommend_board_ids(is_new)
 
-    data = next(response)
-    board = src.models.Board(**data)
+    return board_ids
 
-    return board.id
+
+def fetch_pin_metadata(point_ids: List[str]) -> Iterable:
+    query = src.queries.make_pin_metadata_query(point_ids)
+
+    return src.bigquery.query(bq_client, query)
 
 
 def get_recommend_image_urls(board_id: str) -> List[str]:
     query = src.queries.make_recommend_image_urls_query(board_id)
-    response = bq_client.query(query).result()
+    response = src.bigquery.query(bq_client, query)
 
     return [row.image_url for row in response]
 
 
 def process_user(
     user_id: str,
+    board_id: str,
     pc_kwargs: dict,
     postprocess_kwargs: dict,
 ) -> Tuple[int, int]:
     loader_vectors = fetch_reference_vectors(user_id)
     if loader_vectors.total_rows == 0:
-        return 0, 0, -1
+        return 0, 0
 
-    board_id = get_recommend_board_id(user_id)
     image_urls = get_recommend_image_urls(board_id)
-    pins = []
-
-    for row in loader_vectors:
-        vector = src.models.PinVector.from_dict(dict(row))
+    vectors = src.models.PinVector.from_rows(loader_vectors)
+    reference_values = {}
+    matches = []
+
+    if NAMESPACE_BUCKETS:
+        reference_values = src.pinecone.fetch_values(
+            index=pc_kwargs["index"],
+            point_ids=[vector.point_id for vector in vectors],
+            num_buckets=NAMESPACE_BUCKETS,
+        )
 
+    for vector in vectors:
         neighbors = src.pinecone.get_neighbors(
             point_id=vector.point_id,
             user_id=user_id,
             image_urls=image_urls,
+            values=reference_values.get(vector.point_id),
             **pc_kwargs,
         )
 
-        pins_, image_urls_ = src.pinecone.postprocess_matches(
+        matches_, image_urls = src.pinecone.select_matches(
             matches=neighbors,
-            board_id=board_id,
             image_urls=image_urls,
             **postprocess_kwargs,
         )
 
-        image_urls = image_urls_
-        pins.extend(pins_)
+        matches.extend(matches_)
+
+    if metadata_cache is not None:
+        metadata_cache.fill(match.id for match in matches)
+
+    pins = src.pinecone.matches_to_pins(
+        matches=matches, board_id=board_id, cache=metadata_cache
+    )
 
     n_inserted, _ = src.bigquery.insert_unique(
         client=bq_client,
@@ -124,13 +172,19 @@ def process_user(
     return len(pins), n_inserted
 
 
+@src.profiling.profile_main("recommend")
 def main():
-    global bq_client, pc_index
+    global bq_client, pc_index, metadata_cache
     bq_client, pc_index = initialize_clients()
+    metadata_cache = None
+
+    if SLIM_METADATA:
+        metadata_cache = src.pinecone.MetadataCache(loader=fetch_pin_metadata)
 
     pc_kwargs = {
         "index": pc_index,
         "n": NUM_NEIGHBORS + NUM_PREFETCH,
+        "num_buckets": NAMESPACE_BUCKETS,
     }
 
     postprocess_kwargs = {
@@ -143,21 +197,35 @@ def main():
     batch_ix = 0
 
     while True:
-        loader_user_ids = fetch_user_ids(is_new)
+        with src.metrics.timer("recommend_user_activity"):
+            refresh_user_activity()
+
+        user_ids = [row["user_id"] for row in fetch_user_ids(is_new)]
         n, n_inserted, success_rate, user_ix = 0, 0, -1, 0
 
+        with src.metrics.timer("recommend_boards"), src.profiling.stage("boards"):
+            board_ids = provision_recommend_boards(is_new)
+
         loop = tqdm(
-            iterable=loader_user_ids,
-            total=loader_user_ids.total_rows,
+            iterable=user_ids,
+            total=len(user_ids),
             desc=f"Batch: {batch_ix}",
         )
 
-        for row in loop:
-            n_, n_inserted_ = process_user(
-                user_id=row["user_id"],
-                pc_kwargs=pc_kwargs,
-                postprocess_kwargs=postprocess_kwargs,
-            )
+        for user_id in loop:
+            if user_id not in board_ids:
+                continue
+
+            with src.metrics.timer("recommend_user"), src.profiling.stage("user"):
+                n_, n_inserted_ = process_user(
+                    user_id=user_id,
+                    board_id=board_ids[user_id],
+                    pc_kwargs=pc_kwargs,
+                    postprocess_kwargs=postprocess_kwargs,
+                )
+
+            src.metrics.increment("recommend_pins", n_)
+            src.metrics.increment("recommend_pins_inserted", n_inserted_)
 
             n += n_
             n_inserted += n_inserted_
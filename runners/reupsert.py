@@ -0,0 +1,50 @@
+import sys
+
+sys.path.append("../")
+
+
+from typing import List, Optional
+import argparse, os
+
+from pinecone import Pinecone
+
+import src
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directory", type=str, default=src.enums.ARCHIVE_DIR)
+    parser.add_argument("--index-name", type=str, default=src.enums.PINECONE_INDEX_NAME)
+    parser.add_argument("--namespace", type=str, default=None)
+    parser.add_argument(
+        "--num-buckets",
+        type=int,
+        default=int(os.getenv("PINECONE_NAMESPACE_BUCKETS", "0")) or None,
+    )
+
+    return parser.parse_args(argv)
+
+
+@src.profiling.profile_main("reupsert")
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    secrets = src.utils.load_secrets(env_var_name="SECRETS_JSON")
+
+    pc_client = Pinecone(api_key=secrets.get("PINECONE_API_KEY"))
+    pc_index = pc_client.Index(
+        args.index_name,
+        pool_threads=src.enums.PINECONE_POOL_THREADS,
+    )
+
+    n, n_success = src.archive.reupsert(
+        index=pc_index,
+        directory=args.directory,
+        namespace=args.namespace,
+        num_buckets=args.num_buckets,
+    )
+
+    print(f"Processed: {n} | Upserted: {n_success}")
+
+
+if __name__ == "__main__":
+    main()
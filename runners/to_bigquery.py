@@ -3,33 +3,41 @@ import sys
 sys.path.append("../")
 
 
+from typing import Dict, Iterator, List, Optional
+import os
+
 import src
 
 
+PREFETCH_PAGES = 4
+MERGE_BATCH_PAGES = 5
+CURSOR_PATH = os.getenv("TO_BIGQUERY_CURSOR_PATH", ".state/to_bigquery.json")
+
+
 def get_last_created_at() -> str:
     query = src.queries.make_last_date_query(
         table_id=src.enums.GCP_TABLE_ID_PINTEREST,
     )
 
-    result = bq_client.query(query).result()
+    result = src.bigquery.query(bq_client, query)
 
     for row in result:
         return row["created_at"]
 
 
-def main() -> None:
-    secrets = src.utils.load_secrets(env_var_name="SECRETS_JSON")
+def load_cursor() -> Optional[str]:
+    state = src.utils.load_json(CURSOR_PATH)
 
-    global bq_client
-    bq_client = src.bigquery.init_client(secrets["GCP_CREDENTIALS"])
+    if state:
+        return state.get("created_at")
 
-    spb_client = src.supabase.init_client(
-        url=secrets["SUPABASE_URL"],
-        key=secrets["SUPABASE_SERVICE_ROLE_KEY"],
-    )
 
-    last_created_at = get_last_created_at()
-    index, n_success, n_rows, n_inserted = 0, 0, 0, 0
+def save_cursor(created_at: str) -> bool:
+    return src.utils.save_json_atomic({"created_at": created_at}, CURSOR_PATH)
+
+
+def iterate_pages(spb_client, created_at: Optional[str]) -> Iterator[List[Dict]]:
+    index = 0
 
     while True:
         rows = src.supabase.get_rows(
@@ -37,12 +45,54 @@ def main() -> None:
             table_id=src.enums.SUPABASE_TABLE_ID_PINTEREST,
             n=src.enums.SUPABASE_BATCH_SIZE,
             index=index,
-            created_at=last_created_at,
+            created_at=created_at,
+            order_by=["created_at", "user_id"],
         )
 
         if len(rows) == 0:
             return
 
+        yield rows
+        index += 1
+
+
+def iterate_batches(pages: Iterator[List[Dict]], n_pages: int) -> Iterator[List[Dict]]:
+    batch, n = [], 0
+
+    for rows in pages:
+        batch.extend(rows)
+        n += 1
+
+        if n == n_pages:
+            yield batch
+            batch, n = [], 0
+
+    if batch:
+        yield batch
+
+
+@src.profiling.profile_main("to_bigquery")
+def main() -> None:
+    secrets = src.utils.load_secrets(env_var_name="SECRETS_JSON")
+
+    global bq_client
+    bq_client = src.bigquery.init_client(secrets["GCP_CREDENTIALS"])
+
+    spb_client = src.supabase.init_client(
+        url=secrets["SUPABASE_URL"],
+        key=secrets["SUPABASE_SERVICE_ROLE_KEY"],
+    )
+
+    last_created_at = load_cursor() or get_last_created_at()
+    index, n_success, n_rows, n_inserted = 0, 0, 0, 0
+    cursor_valid = True
+
+    pages = src.utils.iterate_in_background(
+        iterable=iterate_pages(spb_client, last_created_at),
+        maxsize=PREFETCH_PAGES,
+    )
+
+    for rows in iterate_batches(pages, MERGE_BATCH_PAGES):
         n, success = src.bigquery.insert_unique(
             client=bq_client,
             dataset_id=src.enums.GCP_DATASET_ID_SUPABASE,
@@ -51,11 +101,21 @@ def main() -> None:
             field_ids=["user_id"],
         )
 
+        # The cursor only moves past contiguous successful merges.
+        cursor_valid = cursor_valid and success
+
+        if cursor_valid:
+            save_cursor(rows[-1]["created_at"])
+
         index += 1
         n_success += int(success)
         n_rows += len(rows)
+        n_inserted += n
         success_rate = n_success / index
 
+        src.metrics.increment("to_bigquery_rows", len(rows))
+        src.metrics.increment("to_bigquery_rows_inserted", n)
+
         print(
             f"Batch: {index} | "
             f"Processed: {n_rows} | "
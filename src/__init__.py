@@ -1,12 +1,33 @@
-from . import bigquery, enums, encoder, models, queries, supabase, utils, pinecone
+import importlib
 
 __all__ = [
+    "archive",
+    "batching",
     "bigquery",
+    "checkpoint",
     "supabase",
     "queries",
+    "retry",
     "encoder",
+    "metrics",
     "enums",
     "models",
     "utils",
     "pinecone",
+    "phash",
+    "profiling",
 ]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module
+
+        return module
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
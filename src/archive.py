@@ -0,0 +1,167 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from datetime import datetime
+from itertools import islice
+from uuid import uuid4
+import glob, json, os
+
+import numpy as np
+
+from .utils import load_json, save_json_atomic
+from .enums.archive import *
+
+
+class EmbeddingArchive:
+    def __init__(self, directory: str = ARCHIVE_DIR, shard_size: int = ARCHIVE_SHARD_SIZE):
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.shard_size = shard_size
+        self.prefix = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
+        self.num_shards = 0
+        self.shard: Optional[np.memmap] = None
+        self.path: Optional[str] = None
+        self.count = 0
+        self.ids: List[str] = []
+        self.values: List[List[float]] = []
+        self.metadata: List[Optional[Dict]] = []
+
+    def append(self, vectors: List[Dict]):
+        for vector in vectors:
+            self.ids.append(vector["id"])
+            self.values.append(vector["values"])
+            self.metadata.append(vector.get("metadata"))
+
+        if len(self.ids) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        while self.ids:
+            if self.shard is None:
+                self._open_shard(len(self.values[0]))
+
+            n = min(len(self.ids), self.shard_size - self.count)
+            self._write_rows(n)
+
+            if self.count == self.shard_size:
+                self._close_shard()
+
+    def close(self):
+        self.flush()
+        self._close_shard()
+
+    def _open_shard(self, dim: int):
+        name = f"{self.prefix}-{self.num_shards:05d}"
+        self.path = os.path.join(self.directory, name)
+        self.count = 0
+
+        save_json_atomic({"count": 0}, f"{self.path}.json")
+
+        self.shard = np.lib.format.open_memmap(
+            f"{self.path}.npy",
+            mode="w+",
+            dtype=ARCHIVE_DTYPE,
+            shape=(self.shard_size, dim),
+        )
+        self.num_shards += 1
+
+    def _close_shard(self):
+        if self.shard is not None:
+            self.shard.flush()
+            del self.shard
+
+        self.shard = None
+
+    def _write_rows(self, n: int):
+        values = np.asarray(self.values[:n], dtype=ARCHIVE_DTYPE)
+        self.shard[self.count : self.count + n] = values
+        self.shard.flush()
+
+        with open(f"{self.path}.jsonl", "a", encoding="utf-8") as f:
+            for id, metadata in zip(self.ids[:n], self.metadata[:n]):
+                f.write(json.dumps({"id": id, "metadata": metadata}, default=str))
+                f.write("\n")
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.count += n
+        save_json_atomic({"count": self.count}, f"{self.path}.json")
+
+        del self.ids[:n], self.values[:n], self.metadata[:n]
+
+
+def list_shards(directory: str = ARCHIVE_DIR) -> List[str]:
+    return sorted(
+        path[: -len(".npy")]
+        for path in glob.glob(os.path.join(directory, "*.npy"))
+        if os.path.exists(path[: -len(".npy")] + ".jsonl")
+    )
+
+
+def load_shard(path: str) -> Tuple[np.ndarray, List[Dict]]:
+    vectors = np.load(f"{path}.npy", mmap_mode="r")
+    sidecar = load_json(f"{path}.json")
+    count = len(vectors) if sidecar is None else sidecar["count"]
+
+    with open(f"{path}.jsonl", "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in islice(f, count)]
+
+    return vectors[:count], records
+
+
+def iterate_shards(directory: str = ARCHIVE_DIR) -> Iterator[Tuple[np.ndarray, List[Dict]]]:
+    for path in list_shards(directory):
+        yield load_shard(path)
+
+
+def load(directory: str = ARCHIVE_DIR) -> Tuple[List[np.ndarray], List[str]]:
+    shards, ids = [], []
+
+    for vectors, records in iterate_shards(directory):
+        shards.append(vectors)
+        ids.extend(record["id"] for record in records)
+
+    return shards, ids
+
+
+def reupsert(
+    index,
+    directory: str = ARCHIVE_DIR,
+    namespace: Optional[str] = None,
+    batch_size: int = ARCHIVE_SHARD_SIZE,
+    num_buckets: Optional[int] = None,
+) -> Tuple[int, int]:
+    from .pinecone import upsert, upsert_partitioned
+
+    n, n_success = 0, 0
+
+    for vectors, records in iterate_shards(directory):
+        for start in range(0, len(records), batch_size):
+            batch = [
+                _to_vector(record, values)
+                for record, values in zip(
+                    records[start : start + batch_size],
+                    vectors[start : start + batch_size],
+                )
+            ]
+
+            if num_buckets:
+                results = upsert_partitioned(
+                    index=index, vectors=batch, num_buckets=num_buckets
+                )
+            else:
+                results = upsert(index=index, vectors=batch, namespace=namespace)
+
+            n += len(batch)
+            n_success += sum(results)
+
+    return n, n_success
+
+
+def _to_vector(record: Dict, values: np.ndarray) -> Dict:
+    vector = {"id": record["id"], "values": values.astype(np.float32).tolist()}
+
+    if record.get("metadata"):
+        vector["metadata"] = record["metadata"]
+
+    return vector
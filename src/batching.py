@@ -0,0 +1,173 @@
+from typing import List, Optional
+import os
+
+from .enums.batching import *
+
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+CGROUP_MEMORY_LIMIT_PATHS = [
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+]
+
+
+def get_rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def get_child_pids(pid: int) -> List[int]:
+    child_pids = []
+
+    try:
+        names = os.listdir("/proc")
+    except OSError:
+        return child_pids
+
+    for name in names:
+        if not name.isdigit():
+            continue
+
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            child_pids.append(int(name))
+
+    return child_pids
+
+
+def get_total_rss_bytes() -> int:
+    pid = os.getpid()
+
+    return sum(get_rss_bytes(pid_) for pid_ in [pid] + get_child_pids(pid))
+
+
+def get_memory_limit_bytes() -> int:
+    for path in CGROUP_MEMORY_LIMIT_PATHS:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+
+    except (OSError, ValueError):
+        pass
+
+    return 0
+
+
+class BatchSizeController:
+    def __init__(
+        self,
+        size: int = BATCH_SIZE_INITIAL,
+        min_size: int = BATCH_SIZE_MIN,
+        max_size: int = BATCH_SIZE_MAX,
+        max_rss_bytes: Optional[int] = None,
+        growth_factor: float = BATCH_SIZE_GROWTH_FACTOR,
+        window: int = BATCH_SIZE_WINDOW,
+        tolerance: float = BATCH_SIZE_TOLERANCE,
+        probe_interval: int = BATCH_SIZE_PROBE_INTERVAL,
+    ):
+        if max_rss_bytes is None:
+            max_rss_bytes = int(get_memory_limit_bytes() * BATCH_MEMORY_FRACTION)
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = min(max(size, min_size), max_size)
+        self.max_rss_bytes = max_rss_bytes
+        self.growth_factor = growth_factor
+        self.window = window
+        self.tolerance = tolerance
+        self.probe_interval = probe_interval
+        self.decision = "start"
+
+        self.growing = True
+        self.best_size = self.size
+        self.best_throughput = 0.0
+        self.n_holding = 0
+        self._reset_window()
+
+    def __call__(self) -> int:
+        return self.size
+
+    def _reset_window(self):
+        self.n_batches = 0
+        self.n_items = 0
+        self.seconds = 0.0
+        self.peak_rss_bytes = 0
+
+    def _resize(self, size: int, decision: str) -> str:
+        self.size = min(max(size, self.min_size), self.max_size)
+        self.decision = decision
+        self.n_holding = 0
+        self._reset_window()
+
+        return self.decision
+
+    def update(self, n_items: int, seconds: float, n_errors: int = 0) -> Optional[str]:
+        rss_bytes = get_total_rss_bytes()
+
+        self.n_batches += 1
+        self.n_items += n_items
+        self.seconds += seconds
+        self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes)
+
+        if n_errors > 0 or (self.max_rss_bytes and rss_bytes > self.max_rss_bytes):
+            reason = "errors" if n_errors > 0 else "memory"
+            self.growing = False
+            self.best_throughput = 0.0
+            self.best_size = max(self.size // 2, self.min_size)
+
+            return self._resize(self.best_size, f"shrink ({reason})")
+
+        if self.n_batches < self.window or self.seconds <= 0:
+            return None
+
+        throughput = self.n_items / self.seconds
+        peak_rss_bytes = self.peak_rss_bytes
+        self._reset_window()
+
+        if throughput > self.best_throughput * (1 + self.tolerance):
+            self.best_throughput = throughput
+            self.best_size = self.size
+        elif self.growing:
+            self.growing = False
+            return self._resize(self.best_size, "settle")
+
+        if not self.growing:
+            self.n_holding += 1
+
+            if self.n_holding < self.probe_interval:
+                return None
+
+            self.growing = True
+            self.best_throughput = throughput
+
+        next_size = int(self.size * self.growth_factor)
+        projected_rss_bytes = peak_rss_bytes * next_size / self.size
+
+        if self.size >= self.max_size or (
+            self.max_rss_bytes and projected_rss_bytes > self.max_rss_bytes
+        ):
+            self.growing = False
+            self.n_holding = 0
+            return None
+
+        return self._resize(next_size, "grow")
@@ -1,10 +1,17 @@
-from typing import Dict, List, Tuple
-import time
+from typing import Dict, List, Optional, Tuple
+import hashlib, json, time
+from uuid import uuid4
 
 from google.cloud import bigquery
 from google.oauth2 import service_account
 
-from .queries import make_merge_query
+from .queries import (
+    make_merge_query,
+    make_get_watermark_query,
+    make_set_watermark_query,
+)
+from . import metrics
+from .retry import execute_with_retry
 
 
 def init_client(credentials_dict: Dict) -> bigquery.Client:
@@ -21,23 +28,58 @@ def init_client(credentials_dict: Dict) -> bigquery.Client:
     )
 
 
+@metrics.timed("bigquery_query")
+@execute_with_retry(backend="bigquery")
+def query(client: bigquery.Client, query: str) -> bigquery.table.RowIterator:
+    return client.query(query).result()
+
+
+def get_watermark(client: bigquery.Client, name: str) -> Optional[str]:
+    for row in query(client, make_get_watermark_query(name)):
+        return row["value"]
+
+    return None
+
+
+def set_watermark(client: bigquery.Client, name: str, value: str) -> None:
+    query(client, make_set_watermark_query(name, value))
+
+
 def insert(
     client: bigquery.Client,
     dataset_id: str,
     table_id: str,
     rows: List[Dict],
+    field_ids: Optional[List[str]] = None,
 ) -> bool:
     try:
-        errors = client.insert_rows_json(
-            table=f"{dataset_id}.{table_id}", json_rows=rows
+        errors = _insert_rows_json(
+            client=client,
+            table=f"{dataset_id}.{table_id}",
+            rows=rows,
+            row_ids=get_row_ids(rows, field_ids),
         )
 
+        metrics.increment("bigquery_rows_inserted", len(rows) - len(errors))
+
         return len(errors) == 0
 
-    except:
+    except Exception as e:
+        print(e)
         return False
 
 
+def get_row_ids(rows: List[Dict], field_ids: Optional[List[str]] = None) -> List[str]:
+    row_ids = []
+
+    for row in rows:
+        key = [row.get(field_id) for field_id in field_ids] if field_ids else row
+        data = json.dumps(key, sort_keys=True, default=str)
+        row_ids.append(hashlib.sha1(data.encode()).hexdigest())
+
+    return row_ids
+
+
 def insert_unique(
     client: bigquery.Client,
     dataset_id: str,
@@ -45,6 +87,8 @@ def insert_unique(
     rows: List[Dict],
     field_ids: List[str],
 ) -> Tuple[int, bool]:
+    temp_table_ref = None
+
     try:
         if not rows:
             return 0, False
@@ -64,6 +108,7 @@ def insert_unique(
             dataset_id=dataset_id,
             table_id=temp_table_id,
             rows=rows,
+            field_ids=field_ids,
         ):
             _cleanup_temp_table(client, temp_table_ref)
             return 0, False
@@ -82,12 +127,24 @@ def insert_unique(
 
         return num_inserted, True
 
-    except:
-        _cleanup_temp_table(client, temp_table_ref)
+    except Exception as e:
+        print(e)
+
+        if temp_table_ref:
+            _cleanup_temp_table(client, temp_table_ref)
 
         return 0, False
 
 
+@metrics.timed("bigquery_insert")
+@execute_with_retry(backend="bigquery")
+def _insert_rows_json(
+    client: bigquery.Client, table: str, rows: List[Dict], row_ids: List[str]
+) -> List[Dict]:
+    return client.insert_rows_json(table=table, json_rows=rows, row_ids=row_ids)
+
+
+@execute_with_retry(backend="bigquery")
 def _create_temp_table(
     client: bigquery.Client,
     dataset_id: str,
@@ -95,7 +152,7 @@ def _create_temp_table(
     target_table_ref: str,
 ) -> Tuple[str, str]:
     project_id = client.project
-    temp_table_id = f"temp_{table_id}_{int(time.time())}"
+    temp_table_id = f"temp_{table_id}_{int(time.time())}_{uuid4().hex[:8]}"
     temp_table_ref = f"{project_id}.{dataset_id}.{temp_table_id}"
 
     target_table = client.get_table(target_table_ref)
@@ -107,6 +164,8 @@ def _create_temp_table(
     return temp_table_ref, temp_table_id
 
 
+@metrics.timed("bigquery_merge")
+@execute_with_retry(backend="bigquery")
 def _merge_tables(
     client: bigquery.Client,
     target_table_ref: str,
@@ -129,6 +188,11 @@ def _merge_tables(
 
 def _cleanup_temp_table(client: bigquery.Client, temp_table_ref: str) -> None:
     try:
-        client.delete_table(temp_table_ref)
-    except:
-        pass
+        _delete_table(client, temp_table_ref)
+    except Exception as e:
+        print(e)
+
+
+@execute_with_retry(backend="bigquery")
+def _delete_table(client: bigquery.Client, table_ref: str) -> None:
+    client.delete_table(table_ref, not_found_ok=True)
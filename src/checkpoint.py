@@ -0,0 +1,240 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+from array import array
+import json, os, sqlite3, time
+
+from .enums.checkpoint import *
+
+
+class Checkpoint:
+    def __init__(
+        self, path: str = CHECKPOINT_PATH, max_attempts: int = CHECKPOINT_MAX_ATTEMPTS
+    ):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pin (
+                    id TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    row TEXT NOT NULL,
+                    image BLOB,
+                    embedding BLOB,
+                    point_id TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    failed_at REAL
+                )
+                """
+            )
+
+            cursor = self.connection.execute("PRAGMA table_info(pin)")
+            columns = [record[1] for record in cursor.fetchall()]
+
+            for column, definition in [
+                ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+                ("failed_at", "REAL"),
+            ]:
+                if column not in columns:
+                    self.connection.execute(
+                        f"ALTER TABLE pin ADD COLUMN {column} {definition}"
+                    )
+
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS pin_state ON pin (state, position)"
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def count_pending(self) -> int:
+        cursor = self.connection.execute(
+            "SELECT COUNT(*) FROM pin WHERE state NOT IN (?, ?) AND attempts < ?",
+            (CHECKPOINT_STATE_MERGED, CHECKPOINT_STATE_FAILED, self.max_attempts),
+        )
+
+        return cursor.fetchone()[0]
+
+    def prune(self, failed_ttl: float = CHECKPOINT_FAILED_TTL):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM pin WHERE state = ? OR (state = ? AND failed_at < ?)",
+                (
+                    CHECKPOINT_STATE_MERGED,
+                    CHECKPOINT_STATE_FAILED,
+                    time.time() - failed_ttl,
+                ),
+            )
+
+    def enqueue(self, rows: Iterable[Dict]) -> int:
+        cursor = self.connection.execute("SELECT IFNULL(MAX(position), -1) FROM pin")
+        start = cursor.fetchone()[0] + 1
+
+        entries = (
+            (
+                f"{row['user_id']}{row['id']}",
+                position,
+                CHECKPOINT_STATE_QUEUED,
+                json.dumps(row, default=str),
+            )
+            for position, row in enumerate(rows, start=start)
+        )
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO pin (id, position, state, row) VALUES (?, ?, ?, ?)",
+                entries,
+            )
+
+        return self.count_pending()
+
+    def get_max_created_at(self) -> Optional[str]:
+        cursor = self.connection.execute(
+            "SELECT MAX(json_extract(row, '$.created_at')) FROM pin"
+        )
+
+        return cursor.fetchone()[0]
+
+    def iterate_pending(
+        self, batch_size: Union[int, Callable[[], int]]
+    ) -> Iterator[List[Dict]]:
+        position = -1
+
+        while True:
+            limit = batch_size() if callable(batch_size) else batch_size
+            cursor = self.connection.execute(
+                """
+                SELECT id, position, state, row, image, embedding, point_id
+                FROM pin
+                WHERE state NOT IN (?, ?) AND attempts < ? AND position > ?
+                ORDER BY position
+                LIMIT ?
+                """,
+                (
+                    CHECKPOINT_STATE_MERGED,
+                    CHECKPOINT_STATE_FAILED,
+                    self.max_attempts,
+                    position,
+                    limit,
+                ),
+            )
+
+            entries = [self._to_entry(*record) for record in cursor.fetchall()]
+
+            if len(entries) == 0:
+                return
+
+            position = entries[-1]["position"]
+
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE pin SET attempts = attempts + 1 WHERE id = ?",
+                    [(entry["id"],) for entry in entries],
+                )
+
+            yield entries
+
+    def mark_downloaded(self, entries: List[Dict]):
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE pin SET state = ?, image = ? WHERE id = ?",
+                [
+                    (CHECKPOINT_STATE_DOWNLOADED, entry["image"], entry["id"])
+                    for entry in entries
+                ],
+            )
+
+    def mark_encoded(self, entries: List[Dict]):
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE pin SET state = ?, image = NULL, embedding = ?, point_id = ? WHERE id = ?",
+                [
+                    (
+                        CHECKPOINT_STATE_ENCODED,
+                        array("f", entry["embedding"]).tobytes(),
+                        entry["point_id"],
+                        entry["id"],
+                    )
+                    for entry in entries
+                ],
+            )
+
+    def mark_upserted(self, keys: List[str]):
+        self._set_state(keys, CHECKPOINT_STATE_UPSERTED)
+
+    def mark_merged(self, keys: List[str]):
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE pin SET state = ?, image = NULL, embedding = NULL WHERE id = ?",
+                [(CHECKPOINT_STATE_MERGED, key) for key in keys],
+            )
+
+    def mark_failed(self, keys: List[str]):
+        with self.connection:
+            self.connection.executemany(
+                """
+                UPDATE pin SET state = ?, image = NULL, embedding = NULL, failed_at = ?
+                WHERE id = ?
+                """,
+                [(CHECKPOINT_STATE_FAILED, time.time(), key) for key in keys],
+            )
+
+    def expire(self) -> int:
+        with self.connection:
+            cursor = self.connection.execute(
+                """
+                UPDATE pin SET state = ?, image = NULL, embedding = NULL, failed_at = ?
+                WHERE state NOT IN (?, ?) AND attempts >= ?
+                """,
+                (
+                    CHECKPOINT_STATE_FAILED,
+                    time.time(),
+                    CHECKPOINT_STATE_MERGED,
+                    CHECKPOINT_STATE_FAILED,
+                    self.max_attempts,
+                ),
+            )
+
+        return cursor.rowcount
+
+    def _set_state(self, keys: List[str], state: str):
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE pin SET state = ? WHERE id = ?",
+                [(state, key) for key in keys],
+            )
+
+    @staticmethod
+    def _to_entry(
+        key: str,
+        position: int,
+        state: str,
+        row: str,
+        image: Optional[bytes],
+        embedding: Optional[bytes],
+        point_id: Optional[str],
+    ) -> Dict:
+        if embedding is not None:
+            values = array("f")
+            values.frombytes(embedding)
+            embedding = values.tolist()
+
+        return {
+            "id": key,
+            "position": position,
+            "state": state,
+            "row": json.loads(row),
+            "image": image,
+            "embedding": embedding,
+            "point_id": point_id,
+        }
@@ -1,19 +1,32 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from PIL.Image import Image
+from itertools import count
+import os, queue, time
 
 import torch
 from transformers import AutoModel, AutoProcessor
 
+from . import metrics
+
 
 MODEL_NAME = "Marqo/marqo-fashionCLIP"
+POOL_POLL_INTERVAL = 1.0
+POOL_TIMEOUT = float(os.getenv("ENCODER_POOL_TIMEOUT", "600"))
+
+
+def make_encoder(num_workers: int = 1, num_threads: Optional[int] = None):
+    if num_workers > 1 and not torch.cuda.is_available():
+        return FashionCLIPEncoderPool(num_workers=num_workers, num_threads=num_threads)
+
+    return FashionCLIPEncoder()
 
 
 class FashionCLIPEncoder:
-    def __init__(self):
+    def __init__(self, model_name: str = MODEL_NAME):
         self.processor = AutoProcessor.from_pretrained(
-            MODEL_NAME, trust_remote_code=True
+            model_name, trust_remote_code=True
         )
-        self.model = AutoModel.from_pretrained(MODEL_NAME, trust_remote_code=True)
+        self.model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
 
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = self.model.to(self.device)
@@ -23,11 +36,180 @@ class FashionCLIPEncoder:
         kwargs = {
             "return_tensors": "pt",
         }
-        inputs = self.processor(images=images, **kwargs)
 
-        with torch.no_grad():
+        with metrics.timer("preprocess"):
+            inputs = self.processor(images=images, **kwargs)
+
+        with metrics.timer("encode"), torch.no_grad():
             batch = {k: v.to(self.device) for k, v in inputs.items()}
-            return self._encode_images(batch)
+            embeddings = self._encode_images(batch)
+
+        metrics.increment("images_encoded", len(images))
+
+        return embeddings
 
     def _encode_images(self, batch: Dict) -> List[List[float]]:
         return self.model.get_image_features(**batch).detach().cpu().numpy().tolist()
+
+    def close(self):
+        pass
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class FashionCLIPEncoderPool:
+    def __init__(
+        self,
+        num_workers: int,
+        num_threads: Optional[int] = None,
+        model_name: str = MODEL_NAME,
+    ):
+        self.processor = AutoProcessor.from_pretrained(
+            model_name, trust_remote_code=True
+        )
+
+        self.model_name = model_name
+        self.num_workers = num_workers
+        self.num_threads = num_threads or max(1, (os.cpu_count() or 1) // num_workers)
+        self.job_ids = count()
+        self.fallback = None
+
+        context = torch.multiprocessing.get_context("spawn")
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+
+        self.workers = [
+            context.Process(
+                target=_run_worker,
+                args=(self.tasks, self.results, model_name, self.num_threads),
+                daemon=True,
+            )
+            for _ in range(num_workers)
+        ]
+
+        for worker in self.workers:
+            worker.start()
+
+        try:
+            for _ in self.workers:
+                _, _, error = self._get_result()
+
+                if error:
+                    raise RuntimeError(error)
+
+        except Exception:
+            self.close()
+            raise
+
+    def encode(self, images: List[Image]) -> List[List[float]]:
+        if self.fallback is not None:
+            return self.fallback.encode(images)
+
+        with metrics.timer("preprocess"):
+            pixel_values = self.processor(images=images, return_tensors="pt")[
+                "pixel_values"
+            ]
+
+        with metrics.timer("encode"):
+            try:
+                embeddings = self._encode_pixel_values(pixel_values)
+
+            except WorkerError:
+                self.close()
+                self.fallback = FashionCLIPEncoder(self.model_name)
+                metrics.increment("encoder_pool_fallbacks")
+                raise
+
+        metrics.increment("images_encoded", len(images))
+
+        return embeddings
+
+    def _get_result(self):
+        deadline = time.monotonic() + POOL_TIMEOUT
+
+        while True:
+            try:
+                return self.results.get(timeout=POOL_POLL_INTERVAL)
+
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise WorkerError("encoder worker exited unexpectedly")
+
+                if time.monotonic() > deadline:
+                    raise WorkerError(f"encoder pool timed out after {POOL_TIMEOUT}s")
+
+    def _encode_pixel_values(self, pixel_values: torch.Tensor) -> List[List[float]]:
+        job_id = next(self.job_ids)
+        chunks = pixel_values.share_memory_().chunk(self.num_workers)
+
+        for chunk_ix, chunk in enumerate(chunks):
+            self.tasks.put((job_id, chunk_ix, chunk))
+
+        outputs, errors = {}, []
+
+        while len(outputs) + len(errors) < len(chunks):
+            (result_job_id, chunk_ix), embeddings, error = self._get_result()
+
+            if result_job_id != job_id:
+                continue
+
+            if error:
+                errors.append(error)
+            else:
+                outputs[chunk_ix] = embeddings
+
+        if errors:
+            raise RuntimeError(errors[0])
+
+        return [
+            embedding for chunk_ix in range(len(chunks)) for embedding in outputs[chunk_ix]
+        ]
+
+    def close(self):
+        for worker in self.workers:
+            if worker.is_alive():
+                self.tasks.put(None)
+
+        for worker in self.workers:
+            worker.join(timeout=10)
+
+            if worker.is_alive():
+                worker.terminate()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _run_worker(tasks, results, model_name: str, num_threads: int):
+    try:
+        torch.set_num_threads(num_threads)
+        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        model.eval()
+
+        results.put((None, None, None))
+
+    except Exception as e:
+        results.put((None, None, repr(e)))
+        return
+
+    while True:
+        task = tasks.get()
+
+        if task is None:
+            return
+
+        job_id, chunk_ix, pixel_values = task
+
+        try:
+            with torch.no_grad():
+                embeddings = model.get_image_features(pixel_values=pixel_values)
+
+            results.put(((job_id, chunk_ix), embeddings.numpy().tolist(), None))
+
+        except Exception as e:
+            results.put(((job_id, chunk_ix), None, repr(e)))
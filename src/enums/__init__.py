@@ -1,3 +1,7 @@
+from .archive import *
+from .batching import *
 from .bigquery import *
+from .checkpoint import *
+from .phash import *
 from .pinecone import *
 from .supabase import *
@@ -0,0 +1,3 @@
+ARCHIVE_DIR = ".state/archive"
+ARCHIVE_SHARD_SIZE = 4096
+ARCHIVE_DTYPE = "float16"
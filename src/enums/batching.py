@@ -0,0 +1,8 @@
+BATCH_SIZE_INITIAL = 64
+BATCH_SIZE_MIN = 8
+BATCH_SIZE_MAX = 512
+BATCH_SIZE_GROWTH_FACTOR = 1.5
+BATCH_SIZE_WINDOW = 3
+BATCH_SIZE_TOLERANCE = 0.05
+BATCH_SIZE_PROBE_INTERVAL = 20
+BATCH_MEMORY_FRACTION = 0.8
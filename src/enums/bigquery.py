@@ -11,3 +11,11 @@ GCP_TABLE_ID_BOARD_INSERTED = "board_inserted"
 GCP_TABLE_ID_PIN_INSERTED = "pin_inserted"
 GCP_TABLE_ID_CLICK_OUT = "click_out"
 GCP_TABLE_ID_SAVED = "saved"
+GCP_TABLE_ID_USER_ACTIVITY = "user_activity"
+GCP_TABLE_ID_WATERMARK = "watermark"
+
+GCP_WATERMARK_LAG_HOURS = 6
+
+GCP_RATE_LIMIT = 20
+GCP_BURST = 40
+GCP_MAX_CONCURRENCY = 8
@@ -0,0 +1,12 @@
+CHECKPOINT_PATH = ".state/embed.sqlite"
+CHECKPOINT_WATERMARK_BOARD_PIN = "board_pin"
+
+CHECKPOINT_STATE_QUEUED = "queued"
+CHECKPOINT_STATE_DOWNLOADED = "downloaded"
+CHECKPOINT_STATE_ENCODED = "encoded"
+CHECKPOINT_STATE_UPSERTED = "upserted"
+CHECKPOINT_STATE_MERGED = "merged"
+CHECKPOINT_STATE_FAILED = "failed"
+
+CHECKPOINT_MAX_ATTEMPTS = 3
+CHECKPOINT_FAILED_TTL = 7 * 24 * 60 * 60
@@ -0,0 +1,5 @@
+PHASH_PATH = ".state/phash.sqlite"
+PHASH_THRESHOLD = 2
+PHASH_NUM_BANDS = 4
+PHASH_THUMBNAIL_SIZE = 16
+PHASH_MAX_PIXEL_DISTANCE = 4.0
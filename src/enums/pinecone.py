@@ -1 +1,17 @@
 PINECONE_INDEX_NAME = "pins"
+
+PINECONE_POOL_THREADS = 4
+PINECONE_MAX_BATCH_SIZE = 1000
+PINECONE_MAX_REQUEST_BYTES = 2 * 1024 * 1024 - 64 * 1024
+
+PINECONE_RATE_LIMIT = 50
+PINECONE_BURST = 100
+PINECONE_MAX_CONCURRENCY = 8
+
+PINECONE_NAMESPACE_PINTEREST = "pinterest"
+PINECONE_NAMESPACE_USER = "user"
+PINECONE_MAX_QUERY_WORKERS = 8
+PINECONE_FETCH_BATCH_SIZE = 100
+
+PINECONE_SLIM_METADATA_FIELDS = ("from_pinterest", "user_id", "image_url")
+PINECONE_METADATA_CACHE_SIZE = 100_000
@@ -3,6 +3,13 @@ SUPABASE_TABLE_ID_PIN = "pin"
 SUPABASE_TABLE_ID_PINTEREST = "pinterest"
 
 SUPABASE_BATCH_SIZE = 1000
+SUPABASE_BULK_MAX_ROWS = 500
+SUPABASE_BULK_MAX_BYTES = 1024 * 1024
+SUPABASE_BULK_MAX_WORKERS = 4
+
+SUPABASE_RATE_LIMIT = 20
+SUPABASE_BURST = 40
+SUPABASE_MAX_CONCURRENCY = 8
 
 DEFAULT_RECOMMEND_BOARD_NAME = "Recommandé pour toi"
 DEFAULT_RECOMMEND_BOARD_DESCRIPTION = (
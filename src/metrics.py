@@ -0,0 +1,200 @@
+from typing import Dict, List, Optional
+from functools import wraps
+import atexit, json, os, threading, time
+
+
+METRICS_PATH = os.getenv("METRICS_PATH")
+METRICS_FORMAT = os.getenv("METRICS_FORMAT", "json")
+METRICS_PREFIX = "pin_graph"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_enabled = os.getenv("METRICS_ENABLED", "0") == "1" or bool(METRICS_PATH)
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_histograms: Dict[str, "Histogram"] = {}
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+        }
+
+
+class Timer:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *args):
+        observe(f"{self.name}_seconds", time.perf_counter() - self.start)
+
+        if exc_type is not None:
+            increment(f"{self.name}_errors")
+
+
+class NullTimer:
+    def __enter__(self) -> "NullTimer":
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def enable(path: Optional[str] = None, format: Optional[str] = None):
+    global _enabled, METRICS_PATH, METRICS_FORMAT
+
+    _enabled = True
+    METRICS_PATH = path or METRICS_PATH
+    METRICS_FORMAT = format or METRICS_FORMAT
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def increment(name: str, value: float = 1):
+    if not _enabled:
+        return
+
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, value: float):
+    if not _enabled:
+        return
+
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram()
+
+        _histograms[name].observe(value)
+
+
+def timer(name: str):
+    if not _enabled:
+        return NULL_TIMER
+
+    return Timer(name)
+
+
+def timed(name: str):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            with Timer(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summary() -> Dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "histograms": {
+                name: histogram.to_dict() for name, histogram in _histograms.items()
+            },
+        }
+
+
+def to_prometheus() -> str:
+    lines: List[str] = []
+
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        for name, histogram in sorted(_histograms.items()):
+            metric = f"{METRICS_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.sum}")
+            lines.append(f"{metric}_count {histogram.count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def export(path: Optional[str] = None, format: Optional[str] = None) -> bool:
+    path = path or METRICS_PATH
+    format = format or METRICS_FORMAT
+
+    if not _enabled or not path:
+        return False
+
+    try:
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{path}.tmp"
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if format == "prometheus":
+                f.write(to_prometheus())
+            else:
+                json.dump(summary(), f, indent=4)
+
+        os.replace(tmp_path, path)
+
+        return True
+
+    except Exception as e:
+        print(e)
+        return False
+
+
+atexit.register(export)
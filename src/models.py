@@ -1,5 +1,4 @@
-from typing import Optional, List, Dict
-from dataclasses import dataclass
+from typing import Optional, List, Dict, Iterable, Mapping, Sequence, Tuple
 
 from uuid import uuid4
 from datetime import datetime
@@ -10,43 +9,129 @@ from .enums.supabase import (
 )
 
 
-@dataclass
-class Board:
-    user_id: str
-    name: str = DEFAULT_RECOMMEND_BOARD_NAME
-    description: str = DEFAULT_RECOMMEND_BOARD_DESCRIPTION
-    id: Optional[str] = None
-    created_at: Optional[str] = None
-    from_pinterest: bool = False
+class Model:
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
 
-    def __post_init__(self):
-        if not self.id:
-            self.id = str(uuid4())
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS)
+        return f"{type(self).__name__}({fields})"
 
-        if not self.created_at:
-            self.created_at = datetime.now().isoformat()
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+
+        return all(getattr(self, f) == getattr(other, f) for f in self.FIELDS)
 
     def to_dict(self) -> Dict:
-        return self.__dict__
+        return {field: getattr(self, field) for field in self.FIELDS}
 
-    def reset_created_at(self):
-        self.created_at = datetime.now().isoformat()
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping], **kwargs) -> List["Model"]:
+        if kwargs:
+            return [cls(**dict(row, **kwargs)) for row in rows]
 
+        return [cls(**row) for row in rows]
 
-@dataclass
-class Pin:
-    id: str
-    user_id: str
-    board_id: str
-    created_at: str
-    image_url: str
-    from_pinterest: bool = True
-    board_name: Optional[str] = None
-    title: Optional[str] = None
-    point_id: Optional[str] = None
+    @classmethod
+    def from_columns(cls, columns: Mapping[str, Sequence], **kwargs) -> List["Model"]:
+        names = list(columns.keys())
+
+        return [
+            cls(**dict(zip(names, values), **kwargs))
+            for values in zip(*columns.values())
+        ]
+
+
+class Board(Model):
+    __slots__ = ("user_id", "name", "description", "id", "created_at", "from_pinterest")
+    FIELDS = __slots__
+
+    def __init__(
+        self,
+        user_id: str,
+        name: str = DEFAULT_RECOMMEND_BOARD_NAME,
+        description: str = DEFAULT_RECOMMEND_BOARD_DESCRIPTION,
+        id: Optional[str] = None,
+        created_at: Optional[str] = None,
+        from_pinterest: bool = False,
+    ):
+        self.user_id = user_id
+        self.name = name
+        self.description = description
+        self.id = id or str(uuid4())
+        self.created_at = created_at or datetime.now().isoformat()
+        self.from_pinterest = from_pinterest
 
     def to_dict(self) -> Dict:
-        return self.__dict__
+        return {
+            "user_id": self.user_id,
+            "name": self.name,
+            "description": self.description,
+            "id": self.id,
+            "created_at": self.created_at,
+            "from_pinterest": self.from_pinterest,
+        }
+
+    def reset_created_at(self, created_at: Optional[str] = None):
+        self.created_at = created_at or datetime.now().isoformat()
+
+
+class Pin(Model):
+    __slots__ = (
+        "id",
+        "user_id",
+        "board_id",
+        "created_at",
+        "image_url",
+        "from_pinterest",
+        "board_name",
+        "title",
+        "point_id",
+    )
+    FIELDS = __slots__
+
+    def __init__(
+        self,
+        id: str,
+        user_id: str,
+        board_id: str,
+        created_at: str,
+        image_url: str,
+        from_pinterest: bool = True,
+        board_name: Optional[str] = None,
+        title: Optional[str] = None,
+        point_id: Optional[str] = None,
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.board_id = board_id
+        self.created_at = created_at
+        self.image_url = image_url
+        self.from_pinterest = from_pinterest
+        self.board_name = board_name
+        self.title = title
+        self.point_id = point_id
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "board_id": self.board_id,
+            "created_at": self.created_at,
+            "image_url": self.image_url,
+            "from_pinterest": self.from_pinterest,
+            "board_name": self.board_name,
+            "title": self.title,
+            "point_id": self.point_id,
+        }
+
+    def to_metadata(self, fields: Optional[Iterable[str]] = None) -> Dict:
+        return {
+            field: value
+            for field in fields or self.FIELDS
+            if (value := getattr(self, field)) is not None
+        }
 
     def set_board_id(self, board_id: str):
         self.board_id = board_id
@@ -54,16 +139,16 @@ class Pin:
     def set_point_id(self, point_id: str):
         self.point_id = point_id
 
-    def reset_created_at(self):
-        self.created_at = datetime.now().isoformat()
+    def reset_created_at(self, created_at: Optional[str] = None):
+        self.created_at = created_at or datetime.now().isoformat()
 
     def reset_id(self):
         self.id = str(uuid4())
 
-    def to_bigquery(self) -> Dict:
+    def to_bigquery(self, created_at: Optional[str] = None) -> Dict:
         return {
             "id": self.id,
-            "created_at": datetime.now().isoformat(),
+            "created_at": created_at or datetime.now().isoformat(),
             "board_id": self.board_id,
             "image_url": self.image_url,
             "title": self.title,
@@ -72,41 +157,63 @@ class Pin:
         }
 
 
-@dataclass
-class Vector:
-    values: List[float]
-    metadata: Optional[Dict] = None
+class Vector(Model):
+    __slots__ = ("values", "metadata", "id")
+    FIELDS = __slots__
 
-    def __post_init__(self):
-        self.id = str(uuid4())
+    def __init__(
+        self,
+        values: List[float],
+        metadata: Optional[Dict] = None,
+        id: Optional[str] = None,
+    ):
+        self.values = values
+        self.metadata = metadata
+        self.id = id or str(uuid4())
         self.process_metadata()
 
     def to_dict(self) -> Dict:
-        return self.__dict__
-
-    def process_metadata(self):
-        metadata_copy = self.metadata.copy()
-
-        for key, value in metadata_copy.items():
-            if value is None:
-                del self.metadata[key]
+        if self.metadata is None:
+            return {"id": self.id, "values": self.values}
 
+        return {"id": self.id, "values": self.values, "metadata": self.metadata}
 
-@dataclass
-class PinVector:
-    user_id: str
-    pin_id: str
-    point_id: str
-    created_at: Optional[str] = None
-
-    def __post_init__(self):
-        self.id = f"{self.user_id}{self.pin_id}"
-
-        if not self.created_at:
-            self.created_at = datetime.now().isoformat()
+    def process_metadata(self):
+        if self.metadata is None:
+            return
+
+        if any(value is None for value in self.metadata.values()):
+            self.metadata = {
+                key: value for key, value in self.metadata.items() if value is not None
+            }
+
+
+class PinVector(Model):
+    __slots__ = ("user_id", "pin_id", "point_id", "created_at", "id")
+    FIELDS = __slots__
+
+    def __init__(
+        self,
+        user_id: str,
+        pin_id: str,
+        point_id: str,
+        created_at: Optional[str] = None,
+        id: Optional[str] = None,
+    ):
+        self.user_id = user_id
+        self.pin_id = pin_id
+        self.point_id = point_id
+        self.created_at = created_at or datetime.now().isoformat()
+        self.id = id or f"{user_id}{pin_id}"
 
     def to_dict(self) -> Dict:
-        return self.__dict__
+        return {
+            "user_id": self.user_id,
+            "pin_id": self.pin_id,
+            "point_id": self.point_id,
+            "created_at": self.created_at,
+            "id": self.id,
+        }
 
     @classmethod
     def from_dict(cls, data: Dict) -> "PinVector":
@@ -0,0 +1,155 @@
+from typing import Dict, List, Optional
+from array import array
+import os, sqlite3
+
+import numpy as np
+from PIL import Image
+
+from .enums.phash import *
+
+
+HASH_BITS = 64
+BAND_BITS = HASH_BITS // PHASH_NUM_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+DCT_SIZE = 32
+DCT_MATRIX = np.cos(
+    np.pi
+    * np.arange(DCT_SIZE)[:, None]
+    * (2 * np.arange(DCT_SIZE)[None, :] + 1)
+    / (2 * DCT_SIZE)
+)
+
+
+def compute_hash(image: Image.Image) -> int:
+    pixels = np.asarray(
+        image.convert("L").resize((DCT_SIZE, DCT_SIZE), Image.BILINEAR),
+        dtype=np.float64,
+    )
+    coefficients = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:8, :8].flatten()
+    bits = coefficients > np.median(coefficients[1:])
+    value = 0
+
+    for bit in bits:
+        value = (value << 1) | int(bit)
+
+    return value
+
+
+def compute_thumbnail(image: Image.Image) -> bytes:
+    size = (PHASH_THUMBNAIL_SIZE, PHASH_THUMBNAIL_SIZE)
+
+    return image.convert("L").resize(size, Image.BILINEAR).tobytes()
+
+
+def thumbnail_distance(a: bytes, b: bytes) -> float:
+    a_ = np.frombuffer(a, dtype=np.uint8).astype(np.int16)
+    b_ = np.frombuffer(b, dtype=np.uint8).astype(np.int16)
+
+    return float(np.abs(a_ - b_).mean())
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def get_bands(value: int) -> List[int]:
+    return [(value >> (i * BAND_BITS)) & BAND_MASK for i in range(PHASH_NUM_BANDS)]
+
+
+class HashIndex:
+    def __init__(self, path: str = PHASH_PATH):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        bands = ", ".join(f"band{i} INTEGER NOT NULL" for i in range(PHASH_NUM_BANDS))
+
+        with self.connection:
+            self.connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS dct_phash (
+                    point_id TEXT PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    thumbnail BLOB NOT NULL,
+                    embedding BLOB NOT NULL,
+                    {bands}
+                )
+                """
+            )
+
+            for i in range(PHASH_NUM_BANDS):
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS dct_phash_band{i} ON dct_phash (band{i})"
+                )
+
+    def close(self):
+        self.connection.close()
+
+    def lookup(
+        self,
+        value: int,
+        thumbnail: bytes,
+        threshold: int = PHASH_THRESHOLD,
+        max_pixel_distance: float = PHASH_MAX_PIXEL_DISTANCE,
+    ) -> Optional[Dict]:
+        conditions = " OR ".join(f"band{i} = ?" for i in range(PHASH_NUM_BANDS))
+        cursor = self.connection.execute(
+            f"""
+            SELECT hash, point_id, thumbnail, embedding
+            FROM dct_phash
+            WHERE {conditions}
+            """,
+            get_bands(value),
+        )
+
+        best = None
+
+        for hash, point_id, thumbnail_, embedding in cursor:
+            distance = hamming_distance(value, int(hash, 16))
+
+            if distance > threshold or (best is not None and distance >= best[0]):
+                continue
+
+            if thumbnail_distance(thumbnail, thumbnail_) > max_pixel_distance:
+                continue
+
+            best = (distance, point_id, embedding)
+
+        if best is None:
+            return
+
+        distance, point_id, embedding = best
+        values = array("f")
+        values.frombytes(embedding)
+
+        return {
+            "distance": distance,
+            "point_id": point_id,
+            "embedding": values.tolist(),
+        }
+
+    def add(self, entries: List[Dict]):
+        with self.connection:
+            self.connection.executemany(
+                f"""
+                INSERT OR IGNORE INTO dct_phash
+                VALUES (?, ?, ?, ?, {', '.join('?' * PHASH_NUM_BANDS)})
+                """,
+                [
+                    (
+                        entry["point_id"],
+                        f"{entry['phash']:016x}",
+                        entry["thumbnail"],
+                        array("f", entry["embedding"]).tobytes(),
+                        *get_bands(entry["phash"]),
+                    )
+                    for entry in entries
+                ],
+            )
@@ -1,7 +1,24 @@
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, Iterable, List, Dict, Mapping, Tuple, Optional
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import zlib
+
 import pinecone
 
 from .models import Pin
+from . import metrics
+from .utils import chunk_rows
+from .retry import RateLimiter, execute_with_retry, get_limiter, is_retryable
+from .enums.pinecone import (
+    PINECONE_MAX_BATCH_SIZE,
+    PINECONE_MAX_REQUEST_BYTES,
+    PINECONE_NAMESPACE_PINTEREST,
+    PINECONE_NAMESPACE_USER,
+    PINECONE_MAX_QUERY_WORKERS,
+    PINECONE_FETCH_BATCH_SIZE,
+    PINECONE_METADATA_CACHE_SIZE,
+)
 
 
 def insert(
@@ -10,15 +27,131 @@ def insert(
     if len(vectors) == 0:
         return False
 
-    try:
-        response = index.upsert(vectors=vectors, namespace=namespace)
-        n_upserted = response.get("upserted_count", 0)
+    return all(upsert(index=index, vectors=vectors, namespace=namespace))
 
-        return n_upserted == len(vectors)
 
-    except Exception as e:
-        print(e)
-        return False
+@metrics.timed("pinecone_upsert")
+def upsert(
+    index: pinecone.Index,
+    vectors: List[Dict],
+    namespace: Optional[str] = None,
+    max_vectors: int = PINECONE_MAX_BATCH_SIZE,
+    max_bytes: int = PINECONE_MAX_REQUEST_BYTES,
+) -> List[bool]:
+    chunks = chunk_rows(rows=vectors, max_rows=max_vectors, max_bytes=max_bytes)
+    limiter = get_limiter("pinecone")
+    requests, success = deque(), []
+
+    def collect():
+        chunk, request = requests.popleft()
+        chunk_success = _get_upsert_result(index, chunk, namespace, request, limiter)
+        success.extend([chunk_success] * len(chunk))
+
+        metrics.increment("pinecone_chunks")
+        metrics.increment("pinecone_vectors_upserted", len(chunk) * chunk_success)
+
+    for chunk in chunks:
+        while requests and not limiter.semaphore.acquire(blocking=False):
+            collect()
+
+        if not requests:
+            limiter.semaphore.acquire()
+
+        limiter.wait()
+
+        try:
+            request = index.upsert(vectors=chunk, namespace=namespace, async_req=True)
+        except Exception as e:
+            request = e
+
+        requests.append((chunk, request))
+
+    while requests:
+        collect()
+
+    return success
+
+
+def get_namespace(point_id: str, from_pinterest: bool, num_buckets: int = 1) -> str:
+    source = PINECONE_NAMESPACE_PINTEREST if from_pinterest else PINECONE_NAMESPACE_USER
+
+    if num_buckets <= 1:
+        return source
+
+    return f"{source}-{get_bucket(point_id, num_buckets):03d}"
+
+
+def get_namespaces(from_pinterest: bool, num_buckets: int = 1) -> List[str]:
+    source = PINECONE_NAMESPACE_PINTEREST if from_pinterest else PINECONE_NAMESPACE_USER
+
+    if num_buckets <= 1:
+        return [source]
+
+    return [f"{source}-{bucket:03d}" for bucket in range(num_buckets)]
+
+
+def get_bucket(point_id: str, num_buckets: int) -> int:
+    return zlib.crc32(point_id.encode("utf-8")) % num_buckets
+
+
+def partition(vectors: List[Dict], num_buckets: int = 1) -> Dict[str, List[int]]:
+    partitions = {}
+
+    for i, vector in enumerate(vectors):
+        from_pinterest = bool((vector.get("metadata") or {}).get("from_pinterest"))
+        namespace = get_namespace(vector["id"], from_pinterest, num_buckets)
+        partitions.setdefault(namespace, []).append(i)
+
+    return partitions
+
+
+def upsert_partitioned(
+    index: pinecone.Index,
+    vectors: List[Dict],
+    num_buckets: int = 1,
+) -> List[bool]:
+    success = [False] * len(vectors)
+
+    for namespace, positions in partition(vectors, num_buckets).items():
+        results = upsert(
+            index=index,
+            vectors=[vectors[i] for i in positions],
+            namespace=namespace,
+        )
+
+        for i, result in zip(positions, results):
+            success[i] = result
+
+    return success
+
+
+def repartition(
+    index: pinecone.Index,
+    num_buckets: int = 1,
+    namespace: Optional[str] = None,
+    batch_size: int = PINECONE_FETCH_BATCH_SIZE,
+    delete: bool = False,
+) -> Tuple[int, int]:
+    n, n_success = 0, 0
+
+    for ids in index.list(namespace=namespace, limit=batch_size):
+        response = _fetch(index=index, ids=list(ids), namespace=namespace)
+        vectors = [_to_vector(id, vector) for id, vector in response["vectors"].items()]
+
+        for target, positions in partition(vectors, num_buckets).items():
+            batch = [vectors[i] for i in positions]
+            results = upsert(index=index, vectors=batch, namespace=target)
+            moved = [vector["id"] for vector, success in zip(batch, results) if success]
+
+            if delete and moved and target != (namespace or ""):
+                _delete(index=index, ids=moved, namespace=namespace)
+
+            n_success += len(moved)
+            metrics.increment("pinecone_vectors_repartitioned", len(moved))
+
+        n += len(vectors)
+
+    return n, n_success
 
 
 def get_neighbors(
@@ -27,12 +160,26 @@ def get_neighbors(
     user_id: str,
     n: int,
     image_urls: List[str],
+    num_buckets: Optional[int] = None,
+    values: Optional[List[float]] = None,
 ) -> List[pinecone.ScoredVector]:
+    if num_buckets is not None:
+        return _get_partitioned_neighbors(
+            index=index,
+            point_id=point_id,
+            user_id=user_id,
+            n=n,
+            image_urls=image_urls,
+            num_buckets=num_buckets,
+            values=values,
+        )
+
     filter_conditions = _create_filter_conditions(
         user_id=user_id, image_urls=image_urls
     )
 
-    results = index.query(
+    results = _query(
+        index=index,
         id=point_id,
         top_k=n,
         filter=filter_conditions,
@@ -43,6 +190,153 @@ def get_neighbors(
     return results.matches
 
 
+def _get_partitioned_neighbors(
+    index: pinecone.Index,
+    point_id: str,
+    user_id: str,
+    n: int,
+    image_urls: List[str],
+    num_buckets: int,
+    values: Optional[List[float]] = None,
+) -> List[pinecone.ScoredVector]:
+    if values is None:
+        values = fetch_values(index, [point_id], num_buckets).get(point_id)
+
+    if values is None:
+        return []
+
+    filter_conditions = {"user_id": {"$ne": user_id}}
+
+    if image_urls:
+        filter_conditions["image_url"] = {"$nin": image_urls}
+
+    namespaces = get_namespaces(from_pinterest=True, num_buckets=num_buckets)
+    query_kwargs = {
+        "index": index,
+        "vector": values,
+        "top_k": n,
+        "filter": filter_conditions,
+        "include_values": False,
+        "include_metadata": True,
+    }
+
+    if len(namespaces) == 1:
+        return _query(namespace=namespaces[0], **query_kwargs).matches
+
+    max_workers = min(len(namespaces), PINECONE_MAX_QUERY_WORKERS)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_query, namespace=namespace, **query_kwargs)
+            for namespace in namespaces
+        ]
+        matches, errors = [], []
+
+        for namespace, future in zip(namespaces, futures):
+            try:
+                matches.extend(future.result().matches)
+
+            except Exception as e:
+                print(f"{namespace}: {e}")
+                errors.append(e)
+
+    metrics.increment("pinecone_bucket_query_failures", len(errors))
+
+    if len(errors) == len(namespaces):
+        raise errors[-1]
+
+    matches.sort(key=lambda match: match.score, reverse=True)
+
+    return matches[:n]
+
+
+def fetch_values(
+    index: pinecone.Index,
+    point_ids: List[str],
+    num_buckets: int = 1,
+    batch_size: int = PINECONE_FETCH_BATCH_SIZE,
+) -> Dict[str, List[float]]:
+    values = {}
+
+    for from_pinterest in [False, True]:
+        groups = {}
+
+        for point_id in point_ids:
+            if point_id not in values:
+                namespace = get_namespace(point_id, from_pinterest, num_buckets)
+                groups.setdefault(namespace, []).append(point_id)
+
+        for namespace, ids in groups.items():
+            for start in range(0, len(ids), batch_size):
+                response = _fetch(
+                    index=index, ids=ids[start : start + batch_size], namespace=namespace
+                )
+
+                for id, vector in response["vectors"].items():
+                    values[id] = list(vector["values"])
+
+    return values
+
+
+@metrics.timed("pinecone_query")
+@execute_with_retry(backend="pinecone")
+def _query(index: pinecone.Index, **kwargs):
+    return index.query(**kwargs)
+
+
+@metrics.timed("pinecone_fetch")
+@execute_with_retry(backend="pinecone")
+def _fetch(index: pinecone.Index, **kwargs):
+    return index.fetch(**kwargs)
+
+
+@execute_with_retry(backend="pinecone")
+def _delete(index: pinecone.Index, **kwargs):
+    return index.delete(**kwargs)
+
+
+def _to_vector(id: str, vector) -> Dict:
+    return {
+        "id": id,
+        "values": list(vector["values"]),
+        "metadata": dict(vector.get("metadata") or {}),
+    }
+
+
+class MetadataCache:
+    def __init__(
+        self,
+        loader: Callable[[List[str]], Iterable[Mapping]],
+        max_size: int = PINECONE_METADATA_CACHE_SIZE,
+    ):
+        self.loader = loader
+        self.max_size = max_size
+        self.rows: OrderedDict = OrderedDict()
+
+    def fill(self, point_ids: Iterable[str]):
+        missing = []
+
+        for point_id in dict.fromkeys(point_ids):
+            if point_id in self.rows:
+                self.rows.move_to_end(point_id)
+            else:
+                missing.append(point_id)
+
+        metrics.increment("pinecone_metadata_cache_misses", len(missing))
+
+        if not missing:
+            return
+
+        for row in self.loader(missing):
+            self.rows[row["point_id"]] = dict(row)
+
+        while len(self.rows) > self.max_size:
+            self.rows.popitem(last=False)
+
+    def get(self, point_id: str) -> Optional[Dict]:
+        return self.rows.get(point_id)
+
+
 def postprocess_matches(
     matches: List[pinecone.ScoredVector],
     board_id: str,
@@ -50,8 +344,27 @@ def postprocess_matches(
     min_score: float,
     max_score: float,
     image_urls: List[str],
+    cache: Optional[MetadataCache] = None,
 ) -> Tuple[List[Dict], List[str]]:
-    pins, score_list = [], []
+    selected, image_urls = select_matches(
+        matches=matches,
+        n=n,
+        min_score=min_score,
+        max_score=max_score,
+        image_urls=image_urls,
+    )
+
+    return matches_to_pins(selected, board_id=board_id, cache=cache), image_urls
+
+
+def select_matches(
+    matches: List[pinecone.ScoredVector],
+    n: int,
+    min_score: float,
+    max_score: float,
+    image_urls: List[str],
+) -> Tuple[List[pinecone.ScoredVector], List[str]]:
+    selected, score_list = [], []
 
     for match in matches:
         score = round(match.score, 3)
@@ -65,25 +378,49 @@ def postprocess_matches(
         if score in score_list:
             continue
 
-        metadata = match.metadata
-        pin = Pin(**metadata)
+        image_url = match.metadata.get("image_url")
 
-        if pin.image_url in image_urls:
+        if image_url in image_urls:
             continue
 
+        selected.append(match)
+        score_list.append(score)
+        image_urls.append(image_url)
+
+        if len(selected) == n:
+            break
+
+    return selected, image_urls
+
+
+def matches_to_pins(
+    matches: List[pinecone.ScoredVector],
+    board_id: str,
+    cache: Optional[MetadataCache] = None,
+) -> List[Dict]:
+    pins = []
+    created_at = datetime.now().isoformat()
+
+    for match in matches:
+        metadata = match.metadata
+
+        if cache is not None:
+            row = cache.get(match.id)
+
+            if row is None:
+                continue
+
+            metadata = dict(row, **metadata)
+
+        pin = Pin(**metadata)
         pin.set_point_id(match.id)
         pin.set_board_id(board_id)
-        pin.reset_created_at()
+        pin.reset_created_at(created_at)
         pin.reset_id()
 
-        pins.append(pin.to_bigquery())
-        score_list.append(score)
-        image_urls.append(pin.image_url)
-
-        if len(pins) == n:
-            return pins, image_urls
+        pins.append(pin.to_bigquery(created_at))
 
-    return pins, image_urls
+    return pins
 
 
 def _create_filter_conditions(user_id: str, image_urls: List[str]) -> Dict:
@@ -93,3 +430,44 @@ def _create_filter_conditions(user_id: str, image_urls: List[str]) -> Dict:
         filter_conditions["image_url"] = {"$nin": image_urls}
 
     return filter_conditions
+
+
+def _get_upsert_result(
+    index: pinecone.Index,
+    chunk: List[Dict],
+    namespace: Optional[str],
+    request,
+    limiter: RateLimiter,
+) -> bool:
+    error = None
+
+    try:
+        if isinstance(request, Exception):
+            raise request
+
+        response = request.get()
+
+    except Exception as e:
+        error = e
+
+    finally:
+        limiter.semaphore.release()
+
+    if error is not None:
+        if not is_retryable(error):
+            print(error)
+            return False
+
+        try:
+            response = _upsert_chunk(index=index, chunk=chunk, namespace=namespace)
+
+        except Exception as e:
+            print(e)
+            return False
+
+    return response.get("upserted_count", 0) == len(chunk)
+
+
+@execute_with_retry(backend="pinecone")
+def _upsert_chunk(index: pinecone.Index, chunk: List[Dict], namespace: Optional[str]):
+    return index.upsert(vectors=chunk, namespace=namespace)
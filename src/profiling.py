@@ -0,0 +1,187 @@
+from typing import Dict, Optional
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+import atexit, cProfile, os, signal, sys, threading, tracemalloc
+
+
+PROFILE_MODE = os.getenv("PROFILE", "")
+PROFILE_STAGE = os.getenv("PROFILE_STAGE", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "0") == "1"
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLE = "sample"
+
+_profilers: Dict[str, "Profiler"] = {}
+_lock = threading.Lock()
+
+
+class StackSampler:
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_id = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def enable(self):
+        self.thread_id = threading.get_ident()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+
+        while frame is not None:
+            code = frame.f_code
+            names.append(
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+
+        return ";".join(reversed(names))
+
+    def dump_stats(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    def __init__(self, name: str, mode: str):
+        self.name = name
+        self.mode = mode
+        self.depth = 0
+
+        if mode == MODE_SAMPLE:
+            self.profiler = StackSampler()
+            self.extension = "collapsed"
+        else:
+            self.profiler = cProfile.Profile()
+            self.extension = "pstats"
+
+    def __enter__(self) -> "Profiler":
+        if self.depth == 0:
+            self.profiler.enable()
+
+        self.depth += 1
+
+        return self
+
+    def __exit__(self, *args):
+        self.depth -= 1
+
+        if self.depth == 0:
+            self.profiler.disable()
+
+    def dump(self, directory: str, timestamp: str) -> str:
+        path = os.path.join(directory, f"{self.name}-{timestamp}.{self.extension}")
+        self.profiler.dump_stats(path)
+
+        return path
+
+
+class NullProfiler:
+    def __enter__(self) -> "NullProfiler":
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def get_profiler(name: str) -> Profiler:
+    with _lock:
+        if name not in _profilers:
+            _profilers[name] = Profiler(name=name, mode=PROFILE_MODE)
+
+        return _profilers[name]
+
+
+def stage(name: str):
+    if not PROFILE_MODE or PROFILE_STAGE != name:
+        return NULL_PROFILER
+
+    if threading.current_thread() is not threading.main_thread():
+        return NULL_PROFILER
+
+    return get_profiler(name)
+
+
+def profile_main(name: str):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILE_MODE and not PROFILE_TRACEMALLOC:
+                return func(*args, **kwargs)
+
+            signal.signal(signal.SIGTERM, lambda *args: sys.exit(143))
+
+            if PROFILE_TRACEMALLOC:
+                tracemalloc.start()
+
+            try:
+                if PROFILE_MODE and not PROFILE_STAGE:
+                    with get_profiler(name):
+                        return func(*args, **kwargs)
+
+                return func(*args, **kwargs)
+
+            finally:
+                dump(name)
+
+        return wrapper
+
+    return decorator
+
+
+def dump(name: Optional[str] = None) -> None:
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+
+        with _lock:
+            profilers = list(_profilers.values())
+            _profilers.clear()
+
+        for profiler in profilers:
+            print(f"Profile written to {profiler.dump(PROFILE_DIR, timestamp)}")
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+            path = os.path.join(PROFILE_DIR, f"{name or 'run'}-{timestamp}")
+            snapshot.dump(f"{path}.tracemalloc")
+
+            with open(f"{path}.tracemalloc.txt", "w", encoding="utf-8") as f:
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+
+            print(f"Memory snapshot written to {path}.tracemalloc")
+
+    except Exception as e:
+        print(e)
+
+
+atexit.register(dump)
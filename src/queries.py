@@ -22,14 +22,46 @@ def make_merge_query(
     """
 
 
-def make_board_pin_query(n: Optional[int] = None, index: int = 0) -> str:
+def make_board_pin_query(
+    n: Optional[int] = None,
+    index: int = 0,
+    created_at: Optional[str] = None,
+    shard_index: int = 0,
+    num_shards: int = 1,
+    lag_hours: int = GCP_WATERMARK_LAG_HOURS,
+) -> str:
+    board_pin_conditions, pin_vector_filter = [], ""
+
+    if created_at:
+        since = f"TIMESTAMP_SUB(TIMESTAMP('{created_at}'), INTERVAL {lag_hours} HOUR)"
+        board_pin_conditions.append(f"created_at > {since}")
+        pin_vector_filter = f"WHERE created_at > {since}"
+
+    if num_shards > 1:
+        board_pin_conditions.append(
+            f"MOD(ABS(FARM_FINGERPRINT(CAST(id AS STRING))), {num_shards}) = {shard_index}"
+        )
+
+    board_pin_filter = ""
+
+    if board_pin_conditions:
+        board_pin_filter = "WHERE " + " AND ".join(board_pin_conditions)
+
     query = f"""
     SELECT pinterest.user_id, board_pin.* EXCEPT (pinterest_id)
-    FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_BOARD_PIN}` board_pin
+    FROM (
+        SELECT *
+        FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_BOARD_PIN}`
+        {board_pin_filter}
+    ) board_pin
     INNER JOIN `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_PINTEREST}` pinterest USING (pinterest_id)
-    LEFT JOIN `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_PIN_VECTOR}` pin_vector
-        ON CONCAT(pinterest.user_id, board_pin.id) = pin_vector.id
-    WHERE pin_vector.id IS NULL
+    LEFT JOIN (
+        SELECT user_id, pin_id
+        FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_PIN_VECTOR}`
+        {pin_vector_filter}
+    ) pin_vector
+        ON pin_vector.user_id = pinterest.user_id AND pin_vector.pin_id = board_pin.id
+    WHERE pin_vector.pin_id IS NULL
     """
 
     if n:
@@ -46,35 +78,117 @@ def make_last_date_query(table_id: str) -> str:
     """
 
 
-def make_top_user_query(is_new: bool) -> str:
-    query = f"""
-    WITH 
-        click_outs AS (
-        SELECT user_id, COUNT(*) n
-        FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_PROD}.{GCP_TABLE_ID_CLICK_OUT}`
-        GROUP BY user_id
-        )
-        , saves AS (
-        SELECT user_id, COUNT(*) n
-        FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_PROD}.{GCP_TABLE_ID_SAVED}`
+def make_create_watermark_table_query() -> str:
+    return f"""
+    CREATE TABLE IF NOT EXISTS `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_WATERMARK}` (
+        name STRING NOT NULL,
+        value STRING NOT NULL
+    );
+    """
+
+
+def make_get_watermark_query(name: str) -> str:
+    return (
+        make_create_watermark_table_query()
+        + f"""
+    SELECT value
+    FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_WATERMARK}`
+    WHERE name = '{name}';
+    """
+    )
+
+
+def make_set_watermark_query(name: str, value: str) -> str:
+    return (
+        make_create_watermark_table_query()
+        + f"""
+    MERGE `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_WATERMARK}` T
+    USING (SELECT '{name}' AS name, '{value}' AS value) S
+    ON T.name = S.name
+    WHEN MATCHED AND TIMESTAMP(S.value) > TIMESTAMP(T.value) THEN
+        UPDATE SET value = S.value
+    WHEN NOT MATCHED THEN
+        INSERT (name, value) VALUES (S.name, S.value);
+    """
+    )
+
+
+def make_user_activity_merge_query() -> str:
+    user_activity_ref = (
+        f"{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_USER_ACTIVITY}"
+    )
+
+    return f"""
+    CREATE TABLE IF NOT EXISTS `{user_activity_ref}` (
+        user_id STRING NOT NULL,
+        n_click_outs INT64 NOT NULL,
+        n_saves INT64 NOT NULL,
+        last_click_out_at TIMESTAMP,
+        last_save_at TIMESTAMP
+    )
+    CLUSTER BY user_id;
+
+    MERGE `{user_activity_ref}` T
+    USING (
+        WITH
+            watermarks AS (
+            SELECT
+                IFNULL(MAX(last_click_out_at), TIMESTAMP('1970-01-01')) click_out_at,
+                IFNULL(MAX(last_save_at), TIMESTAMP('1970-01-01')) save_at
+            FROM `{user_activity_ref}`
+            )
+            , events AS (
+            SELECT user_id, COUNT(*) n_click_outs, 0 n_saves,
+                MAX(created_at) last_click_out_at, CAST(NULL AS TIMESTAMP) last_save_at
+            FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_PROD}.{GCP_TABLE_ID_CLICK_OUT}`
+            WHERE created_at > (SELECT click_out_at FROM watermarks)
+            GROUP BY user_id
+            UNION ALL
+            SELECT user_id, 0 n_click_outs, COUNT(*) n_saves,
+                CAST(NULL AS TIMESTAMP) last_click_out_at, MAX(created_at) last_save_at
+            FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_PROD}.{GCP_TABLE_ID_SAVED}`
+            WHERE created_at > (SELECT save_at FROM watermarks)
+            GROUP BY user_id
+            )
+        SELECT
+            user_id,
+            SUM(n_click_outs) n_click_outs,
+            SUM(n_saves) n_saves,
+            MAX(last_click_out_at) last_click_out_at,
+            MAX(last_save_at) last_save_at
+        FROM events
         GROUP BY user_id
-        )
-        , users AS (
-        SELECT user_id FROM click_outs WHERE n > 20
-        UNION ALL
-        SELECT user_id FROM saves WHERE n > 10
-        )
-    SELECT DISTINCT(user_id) 
-    FROM users
+    ) S
+    ON T.user_id = S.user_id
+    WHEN MATCHED THEN
+        UPDATE SET
+            n_click_outs = T.n_click_outs + S.n_click_outs,
+            n_saves = T.n_saves + S.n_saves,
+            last_click_out_at = IFNULL(S.last_click_out_at, T.last_click_out_at),
+            last_save_at = IFNULL(S.last_save_at, T.last_save_at)
+    WHEN NOT MATCHED THEN
+        INSERT (user_id, n_click_outs, n_saves, last_click_out_at, last_save_at)
+        VALUES (S.user_id, S.n_click_outs, S.n_saves, S.last_click_out_at, S.last_save_at);
     """
 
+
+def make_top_user_query(is_new: bool, shuffle: bool = True) -> str:
+    query = f"""
+    SELECT activity.user_id
+    FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_USER_ACTIVITY}` activity
+    """
+    condition = "(activity.n_click_outs > 20 OR activity.n_saves > 10)"
+
     if is_new:
         query += f"""
         LEFT JOIN `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_PIN_VECTOR}` pin_vector USING (user_id)
-        WHERE pin_vector.user_id IS NULL;
+        WHERE {condition} AND pin_vector.user_id IS NULL
         """
     else:
-        query += f"ORDER BY RAND();"
+        query += f"WHERE {condition}"
+
+        if shuffle:
+            query += "\nORDER BY RAND()"
 
     return query
 
@@ -111,11 +225,42 @@ def make_pin_vector_query(
     return base_query
 
 
-def make_recommend_board_id_query(user_id: str) -> str:
+def make_recommend_board_ids_query(is_new: bool) -> str:
     return f"""
-    SELECT *
-    FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_BOARD_RECOMMEND}`
-    WHERE user_id = '{user_id}'
+    WITH top_user AS ({make_top_user_query(is_new, shuffle=False)})
+    SELECT
+        top_user.user_id,
+        board.id AS board_id,
+        pin_vector.user_id IS NOT NULL AS has_vectors
+    FROM top_user
+    LEFT JOIN (
+        SELECT user_id, MIN(id) AS id
+        FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_BOARD_RECOMMEND}`
+        WHERE user_id IN (SELECT user_id FROM top_user)
+        GROUP BY user_id
+    ) board
+        USING(user_id)
+    LEFT JOIN (
+        SELECT DISTINCT user_id
+        FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_PIN_VECTOR}`
+        WHERE user_id IN (SELECT user_id FROM top_user)
+    ) pin_vector
+        USING(user_id)
+    """
+
+
+def make_pin_metadata_query(point_ids: List[str]) -> str:
+    point_ids_str = ", ".join([f"'{point_id}'" for point_id in point_ids])
+
+    return f"""
+    SELECT pin_vector.point_id, pinterest.user_id, board_pin.* EXCEPT (pinterest_id)
+    FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_PIN_VECTOR}` pin_vector
+    INNER JOIN `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_BOARD_PIN}` board_pin
+        ON board_pin.id = pin_vector.pin_id
+    INNER JOIN `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_PINTEREST}` pinterest
+        ON pinterest.pinterest_id = board_pin.pinterest_id
+        AND pinterest.user_id = pin_vector.user_id
+    WHERE pin_vector.point_id IN UNNEST([{point_ids_str}])
     """
 
 
@@ -131,7 +276,7 @@ def make_insert_board_query() -> str:
     return f"""
     SELECT board.* 
     FROM `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_BOARD_RECOMMEND}` board
-    LEFT JOIN `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_PIN_INSERTED}` inserted
+    LEFT JOIN `{GCP_PROJECT_ID}.{GCP_DATASET_ID_SUPABASE}.{GCP_TABLE_ID_BOARD_INSERTED}` inserted
         USING(id)
     WHERE inserted.id IS NULL;
     """
@@ -0,0 +1,193 @@
+from typing import Dict, Optional
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from functools import wraps
+import random, threading, time
+
+from .enums.bigquery import GCP_RATE_LIMIT, GCP_BURST, GCP_MAX_CONCURRENCY
+from .enums.pinecone import PINECONE_RATE_LIMIT, PINECONE_BURST, PINECONE_MAX_CONCURRENCY
+from .enums.supabase import (
+    SUPABASE_RATE_LIMIT,
+    SUPABASE_BURST,
+    SUPABASE_MAX_CONCURRENCY,
+)
+
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTION_NAMES = {
+    "ConnectionError",
+    "ConnectTimeout",
+    "ConnectError",
+    "ReadTimeout",
+    "ReadError",
+    "WriteTimeout",
+    "PoolTimeout",
+    "Timeout",
+    "TimeoutError",
+    "RemoteProtocolError",
+    "ProtocolError",
+    "ChunkedEncodingError",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "BadGateway",
+    "GatewayTimeout",
+    "DeadlineExceeded",
+}
+RETRYABLE_REASONS = ("rateLimitExceeded", "backendError", "jobRateLimitExceeded")
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int, max_concurrency: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def __enter__(self) -> "RateLimiter":
+        self.wait()
+        self.semaphore.acquire()
+
+        return self
+
+    def __exit__(self, *args):
+        self.semaphore.release()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+            time.sleep(delay)
+
+    def block(self, delay: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+
+LIMITERS: Dict[str, RateLimiter] = {
+    "bigquery": RateLimiter(GCP_RATE_LIMIT, GCP_BURST, GCP_MAX_CONCURRENCY),
+    "pinecone": RateLimiter(
+        PINECONE_RATE_LIMIT, PINECONE_BURST, PINECONE_MAX_CONCURRENCY
+    ),
+    "supabase": RateLimiter(
+        SUPABASE_RATE_LIMIT, SUPABASE_BURST, SUPABASE_MAX_CONCURRENCY
+    ),
+}
+
+
+def get_limiter(backend: Optional[str]) -> Optional[RateLimiter]:
+    if backend:
+        return LIMITERS[backend]
+
+
+def get_status_code(exception: Exception) -> Optional[int]:
+    for attr in ("status_code", "status", "code"):
+        value = getattr(exception, attr, None)
+
+        if isinstance(value, int):
+            return value
+
+    response = getattr(exception, "response", None)
+    value = getattr(response, "status_code", None)
+
+    if isinstance(value, int):
+        return value
+
+
+def get_retry_after(exception: Exception) -> Optional[float]:
+    headers = getattr(exception, "headers", None)
+
+    if headers is None:
+        headers = getattr(getattr(exception, "response", None), "headers", None)
+
+    if not headers:
+        return
+
+    value = headers.get("Retry-After") or headers.get("retry-after")
+
+    if value is None:
+        return
+
+    try:
+        return max(0.0, float(value))
+
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    except Exception:
+        return
+
+
+def is_retryable(exception: Exception) -> bool:
+    status_code = get_status_code(exception)
+
+    if status_code in RETRYABLE_STATUS_CODES:
+        return True
+
+    if any(reason in str(exception) for reason in RETRYABLE_REASONS):
+        return True
+
+    return any(
+        cls.__name__ in RETRYABLE_EXCEPTION_NAMES for cls in type(exception).__mro__
+    )
+
+
+def compute_delay(attempt: int, delay: float, max_delay: float) -> float:
+    return random.uniform(0, min(max_delay, delay * 2**attempt))
+
+
+def execute_with_retry(
+    max_retries: int = 3,
+    delay: float = 1.0,
+    max_delay: float = 30.0,
+    backend: Optional[str] = None,
+):
+    limiter = get_limiter(backend)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_retries):
+                try:
+                    if limiter is None:
+                        return func(*args, **kwargs)
+
+                    with limiter:
+                        return func(*args, **kwargs)
+
+                except Exception as e:
+                    if attempt == max_retries - 1 or not is_retryable(e):
+                        raise
+
+                    retry_after = get_retry_after(e)
+
+                    if retry_after is not None and limiter is not None:
+                        limiter.block(retry_after)
+
+                    time.sleep(
+                        retry_after
+                        if retry_after is not None
+                        else compute_delay(attempt, delay, max_delay)
+                    )
+
+        return wrapper
+
+    return decorator
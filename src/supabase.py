@@ -1,8 +1,16 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Union
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 from supabase.lib.client_options import ClientOptions
 
-from .utils import execute_with_retry
+from . import metrics
+from .retry import execute_with_retry
+from .utils import chunk_rows
+from .enums.supabase import (
+    SUPABASE_BULK_MAX_ROWS,
+    SUPABASE_BULK_MAX_BYTES,
+    SUPABASE_BULK_MAX_WORKERS,
+)
 
 
 def init_client(url: str, key: str, schema: str = "public") -> Client:
@@ -18,13 +26,15 @@ def init_client(url: str, key: str, schema: str = "public") -> Client:
     return create_client(**kwargs)
 
 
-@execute_with_retry()
+@metrics.timed("supabase_select")
+@execute_with_retry(backend="supabase")
 def get_rows(
     client: Client,
     table_id: str,
     n: int,
     index: int,
     created_at: Optional[str] = None,
+    order_by: Optional[Union[str, Sequence[str]]] = None,
 ) -> List[Dict]:
     offset = int(index * n)
 
@@ -33,10 +43,17 @@ def get_rows(
     if created_at:
         query = query.gte("created_at", created_at)
 
+    if isinstance(order_by, str):
+        order_by = [order_by]
+
+    for column in order_by or []:
+        query = query.order(column)
+
     return query.execute().data
 
 
-@execute_with_retry()
+@metrics.timed("supabase_rpc")
+@execute_with_retry(backend="supabase")
 def execute_rpc(
     client: Client,
     fn: str,
@@ -51,12 +68,38 @@ def insert(
     rows: List[Dict],
 ) -> bool:
     try:
-        response = client.table(table_id).upsert(json=rows).execute()
-
-        print(response)
+        response = _upsert(client=client, table_id=table_id, rows=rows)
 
         return len(response.data) > 0
 
     except Exception as e:
         print(e)
         return False
+
+
+@metrics.timed("supabase_upsert")
+@execute_with_retry(backend="supabase")
+def _upsert(client: Client, table_id: str, rows: List[Dict]):
+    return client.table(table_id).upsert(json=rows).execute()
+
+
+def bulk_insert(
+    client: Client,
+    table_id: str,
+    rows: List[Dict],
+    max_rows: int = SUPABASE_BULK_MAX_ROWS,
+    max_bytes: int = SUPABASE_BULK_MAX_BYTES,
+    max_workers: int = SUPABASE_BULK_MAX_WORKERS,
+) -> List[Dict]:
+    if len(rows) == 0:
+        return []
+
+    chunks = chunk_rows(rows=rows, max_rows=max_rows, max_bytes=max_bytes)
+
+    def insert_chunk(chunk: List[Dict]) -> bool:
+        return insert(client=client, table_id=table_id, rows=chunk)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        results = list(executor.map(insert_chunk, chunks))
+
+    return [row for chunk, success in zip(chunks, results) if success for row in chunk]
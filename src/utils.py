@@ -1,9 +1,11 @@
-from typing import Any
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
-import json, requests, os, time
-from functools import wraps
+import io, json, requests, os, queue, threading
 from PIL import Image
 
+from . import metrics
+from .retry import execute_with_retry
+
 
 def load_secrets(env_var_name: str) -> Any:
     return json.loads(os.getenv(env_var_name))
@@ -18,7 +20,90 @@ def save_json(data: Any, file_path: str) -> bool:
         return False
 
 
+def load_json(file_path: str) -> Optional[Any]:
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except:
+        return
+
+
+def save_json_atomic(data: Any, file_path: str) -> bool:
+    directory = os.path.dirname(file_path)
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{file_path}.tmp"
+
+    if not save_json(data, tmp_path):
+        return False
+
+    os.replace(tmp_path, file_path)
+
+    return True
+
+
+def iterate_in_background(iterable: Iterable, maxsize: int = 1) -> Iterator:
+    items = queue.Queue(maxsize=maxsize)
+    sentinel = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except Exception as e:
+            items.put(e)
+        finally:
+            items.put(sentinel)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+
+    while True:
+        item = items.get()
+
+        if item is sentinel:
+            return
+
+        if isinstance(item, Exception):
+            raise item
+
+        yield item
+
+
+def chunk_rows(
+    rows: List[Dict],
+    max_rows: int,
+    max_bytes: int,
+) -> List[List[Dict]]:
+    chunks, chunk, chunk_bytes = [], [], 0
+
+    for row in rows:
+        row_bytes = len(json.dumps(row, default=str).encode("utf-8"))
+
+        if chunk and (len(chunk) == max_rows or chunk_bytes + row_bytes > max_bytes):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+
+        chunk.append(row)
+        chunk_bytes += row_bytes
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
 def download_image_as_pil(url: str, timeout: int = 10) -> Image.Image:
+    content = download_image(url, timeout=timeout)
+
+    if content:
+        return load_image(content)
+
+
+@metrics.timed("download")
+def download_image(url: str, timeout: int = 10) -> Optional[bytes]:
     try:
         REQUESTS_HEADERS = {
             "User-Agent": (
@@ -28,33 +113,22 @@ def download_image_as_pil(url: str, timeout: int = 10) -> Image.Image:
             )
         }
 
-        response = requests.get(
-            url, stream=True, headers=REQUESTS_HEADERS, timeout=timeout
-        )
+        response = requests.get(url, headers=REQUESTS_HEADERS, timeout=timeout)
 
         if response.status_code == 200:
-            return Image.open(response.raw)
+            return response.content
 
     except Exception as e:
         return
 
 
-def execute_with_retry(max_retries: int = 3, delay: float = 1.0):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
-
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    if attempt < max_retries - 1:
-                        time.sleep(delay * (attempt + 1))
-                    continue
-            raise last_exception
+@metrics.timed("decode")
+def load_image(content: bytes) -> Optional[Image.Image]:
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.load()
 
-        return wrapper
+        return image
 
-    return decorator
+    except Exception as e:
+        return